@@ -1,12 +1,125 @@
 import pandas as pd
+import numpy as np
 import datetime
 from dateutil.relativedelta import relativedelta
 import os
 from datetime import datetime
 import glob
 import shutil
+import io
+import argparse
+import contextlib
+import traceback
+import hashlib
+import json
+import decimal
+import importlib.util
+import calendar
+import sys
+import time
+import sqlite3
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def process_closed_won_opportunities():
+# Columns read from the Closed Won export
+CLOSED_WON_COLUMNS = [
+    'Account Name', 'Five9 Account Number', 'Close Date', 'Product Code', 
+    'Amount', 'Opportunity Type', 'Opportunity ID', 'Account ID', 'Account Status'
+]
+
+# Declared ingest types: the low-cardinality columns are categorical. Close Date is read as text, so
+# every CSV engine passes the same values to the date parser. Amounts and account numbers are left
+# to inference so the output keeps their formatting.
+CLOSED_WON_DTYPES = {
+    'Close Date': str,
+    'Product Code': 'category',
+    'Opportunity Type': 'category',
+    'Account Status': 'category',
+}
+
+# Close Date format of the Closed Won export
+CLOSE_DATE_FORMAT = '%m/%d/%Y'
+
+# Rows read per chunk when streaming an export
+STREAM_CHUNK_ROWS = 50000
+
+# BigQuery column types of the ledger output
+LEDGER_BIGQUERY_SCHEMA = [
+    ('Account_Name', 'STRING'), ('Five9_Account_Number', 'INTEGER'), ('Date', 'DATE'),
+    ('Product_Code', 'STRING'), ('Amount', 'NUMERIC'), ('Opportunity_Type', 'STRING'),
+    ('Opportunity_ID', 'STRING'), ('Account_ID', 'STRING'), ('Account_Status', 'STRING'), ('Note', 'STRING')
+]
+
+# Columns of the ledger output, in order
+LEDGER_OUTPUT_COLUMNS = [column for column, _ in LEDGER_BIGQUERY_SCHEMA]
+
+# Low-cardinality ledger output columns, read as categoricals by the scripts that load a ledger
+LEDGER_CATEGORICAL_COLUMNS = [col.replace(' ', '_') for col, dtype in CLOSED_WON_DTYPES.items()
+                              if dtype == 'category'] + ['Note']
+
+# Ledger Note codes. The engines store a code plus a suffix (e.g. "- Swap") per row and the
+# legacy Note text is only rendered for output (see render_notes).
+NOTE_NONE = 0
+NOTE_DUPLICATE = 1
+NOTE_ON_DEMAND_ENTRY = 2
+NOTE_REDUCTION = 3
+NOTE_START_OF_SUBSCRIPTION = 4
+NOTE_SUBSCRIBED_BILLING = 5
+NOTE_REDUCTION_SUBSCRIBED_BILLING = 6
+NOTE_REDUCTION_END_OF_SUBSCRIPTION = 7
+
+# Note text by code
+NOTE_TEXT = [
+    '', 'Duplicate', 'On Demand Entry', 'Reduction', 'Start of Subscription', 'Subscribed Billing',
+    'Reduction - Subscribed Billing', 'Reduction - End of Subscription'
+]
+
+# Note suffixes of swapped, churned and inactive subscriptions
+SWAP_SUFFIX = '- Swap'
+CHURNED_SUFFIX = '- Churned'
+INACTIVE_SUFFIX = '- Inactive'
+
+# Accounts that get special intermediate entries (see special_intermediate_entries)
+SPECIAL_ENTRY_ACCOUNTS = ['ADT Solar LLC (fka SUNPRO)', 'Electronic Caregiver', 'Sun Source Energy']
+
+# Columns read when checking that an export can be streamed: the account order, and the numeric
+# columns whose output format depends on the whole export
+STREAM_SCAN_COLUMNS = ['Account Name', 'Five9 Account Number', 'Amount']
+
+# Partition for ledger rows without a Date in month-partitioned output
+HIVE_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Fingerprints and ledger plan kept in the output directory between incremental runs
+LEDGER_STATE_FILE = 'Quick_Assist_Ledger_State.pkl'
+
+# Manifest (in the archive directory) of the processed exports, keyed by content hash
+ARCHIVE_MANIFEST_FILE = 'Quick_Assist_Ledger_Manifest.json'
+
+# Directory (in the output directory) of the cached expanded ledgers
+LEDGER_CACHE_DIR = 'Quick_Assist_Ledger_Cache'
+
+# Ledger store (an SQLite database in the output directory) that --store upserts every ledger into
+LEDGER_STORE_FILE = 'Quick_Assist_Ledger.sqlite'
+
+# SQLite column types of the ledger store. Amounts are stored as exact integer cents (Amount_Cents).
+LEDGER_STORE_TYPES = {'STRING': 'TEXT', 'INTEGER': 'INTEGER', 'DATE': 'TEXT'}
+
+# Key of a ledger store row. Entry numbers the rows that share the rest of the key (e.g. the
+# Duplicate entry of an opportunity, or the billing rows of a swapped subscription).
+LEDGER_STORE_KEY = ['Opportunity_ID', 'Account_Name', 'Date', 'Entry']
+
+# Per-stage profile log (one JSON line per profiled run, kept in the output directory)
+PROFILE_LOG_FILE = 'Quick_Assist_Ledger_Profile.jsonl'
+
+# Environment variable that turns on profiling without --profile (e.g. QUICK_ASSIST_LEDGER_PROFILE=1)
+PROFILE_ENV_VAR = 'QUICK_ASSIST_LEDGER_PROFILE'
+
+# Stage records of the run being profiled, or None when profiling is off
+stage_profile = None
+
+def process_closed_won_opportunities(parallel=False, max_workers=None, shards=1, stream=False, incremental=False,
+                                     output_format='csv', partition_by_month=False, profile=False, as_of=None,
+                                     cache=False, store=False):
     # Define directory paths
     input_dir = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Revenue Dashboard\QuickAssist_Ledger\In"
     output_dir = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Revenue Dashboard\QuickAssist_Ledger\Out"
@@ -25,625 +138,2384 @@ def process_closed_won_opportunities():
         print(f"No CSV files found in {input_dir}")
         return
     
+    # Skip exports whose contents were already processed for this as-of date, before parsing them
+    as_of = resolve_as_of(as_of)
+    csv_files, content_hashes = new_exports(csv_files, archive_dir, as_of)
+    
+    # Several exports at once (e.g. a backfill) can be spread over worker processes.
+    # Incremental runs share one state file, so they process the exports one at a time.
+    if parallel and len(csv_files) > 1 and not incremental:
+        process_files_parallel(csv_files, output_dir, archive_dir, max_workers, content_hashes, stream=stream,
+                               output_format=output_format, partition_by_month=partition_by_month,
+                               profile=profile, as_of=as_of, cache=cache, store=store)
+        return
+    
     # Process each CSV file found
     for file_path in csv_files:
-        process_file(file_path, output_dir, archive_dir)
+        output_path = process_file(file_path, output_dir, archive_dir, shards=shards, max_workers=max_workers,
+                                   stream=stream, incremental=incremental, output_format=output_format,
+                                   partition_by_month=partition_by_month, profile=profile, as_of=as_of,
+                                   cache=cache, store=store)
+        if output_path:
+            record_processed_export(archive_dir, content_hashes[file_path], file_path, output_path)
+
+def process_files_parallel(csv_files, output_dir, archive_dir, max_workers=None, content_hashes=None, **options):
+    """
+    Processes several Closed Won exports at the same time in a process pool.
+    
+    Each worker writes its own output file and returns its console output, which is printed
+    as one block when the file completes. Archiving the source files and copying the script
+    are done here, one at a time, instead of inside the workers.
+    
+    Args:
+        csv_files (list): Paths of the input CSV files
+        output_dir (str): Directory for the ledger output files
+        archive_dir (str): Directory the processed source files are moved to
+        max_workers (int, optional): Number of worker processes (defaults to the CPU count)
+        content_hashes (dict, optional): Content hash of each file, to record it in the archive manifest
+        **options: Extra keyword arguments for process_file
+    """
+    print(f"Processing {len(csv_files)} files in parallel...")
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_file_captured, file_path, output_dir, archive_dir, **options): file_path
+                   for file_path in csv_files}
+        
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                output_path, console_output = future.result()
+            except Exception as e:
+                print(f"Error processing file {os.path.basename(file_path)}: {e}")
+                continue
+            
+            print(console_output, end="")
+            
+            # Only archive the files that produced an output
+            if output_path:
+                archive_source_file(file_path, archive_dir)
+                if content_hashes:
+                    record_processed_export(archive_dir, content_hashes[file_path], file_path, output_path)
+    
+    copy_script_to_production()
+
+def process_file_captured(file_path, output_dir, archive_dir, **options):
+    """
+    Runs process_file in a worker process with its console output captured.
+    
+    Returns:
+        tuple: (output path or None, captured console output)
+    """
+    console = io.StringIO()
+    output_path = None
+    with contextlib.redirect_stdout(console):
+        try:
+            output_path = process_file(file_path, output_dir, archive_dir, manage_files=False, **options)
+        except Exception:
+            print(f"Error processing file {os.path.basename(file_path)}:")
+            print(traceback.format_exc())
+    
+    return output_path, console.getvalue()
 
-def process_file(file_path, output_dir, archive_dir):
+def process_file(file_path, output_dir, archive_dir, manage_files=True, shards=1,
+                 max_workers=None, stream=False, chunksize=STREAM_CHUNK_ROWS, incremental=False,
+                 output_format='csv', partition_by_month=False, profile=False, as_of=None, cache=False,
+                 store=False):
     file_name = os.path.basename(file_path)
     print(f"Processing file: {file_name}...")
     
-    # Load the CSV file
+    # Record time, memory and row counts per stage when profiling
+    profiling = profile or profiling_requested()
+    if profiling:
+        started_tracing = start_stage_profile()
+    
     try:
-        df = pd.read_csv(file_path)
-    except Exception as e:
-        print(f"Error loading file {file_name}: {e}")
-        return
+        # Streaming writes the CSV batch by batch. Incremental runs fingerprint the whole export, and
+        # the cache, the store, Parquet and month partitions work on the whole ledger, so they don't stream it.
+        stream = (stream and output_format == 'csv' and not partition_by_month and not incremental and
+                  not cache and not store)
+        
+        # Check the header first, so only the ledger columns are loaded
+        try:
+            df = pd.read_csv(file_path, nrows=0)
+        except Exception as e:
+            print(f"Error loading file {file_name}: {e}")
+            return
+        
+        # Check if all required columns exist in the dataframe
+        missing_cols = [col for col in CLOSED_WON_COLUMNS if col not in df.columns]
+        if missing_cols:
+            print(f"Missing columns in {file_name}: {missing_cols}")
+            return
+        
+        # Wall time of each stage, for the run report
+        timings = {}
+        
+        # Subscribed Billing runs up to and including the as-of date (today unless given)
+        as_of = resolve_as_of(as_of)
+        
+        # Reruns on an unchanged export reuse the ledger expanded for the same billing month
+        result_df = None
+        plan = None
+        from_cache = False
+        if cache:
+            with timed_stage(timings, 'cache_lookup'):
+                cache_path = ledger_cache_path(os.path.join(output_dir, LEDGER_CACHE_DIR), file_content_hash(file_path),
+                                               as_of)
+                cached = load_cached_ledger(cache_path, as_of)
+            if cached is not None:
+                result_df, amount_dtype, source_rows = cached
+                from_cache = True
+                print(f"Ledger as of {as_of:%m/%d/%Y} loaded from cache.")
+        
+        # Exports already sorted by account are run through the engine one batch of accounts at a time,
+        # and each batch's ledger rows are written before the next batch is read
+        streamed = False
+        if stream:
+            with timed_stage(timings, 'scan') as stage:
+                scanned = scan_sorted_export(file_path, chunksize)
+                stage['rows_out'] = None if scanned is None else scanned[1]
+            if scanned is None:
+                print(f"{file_name} is not sorted by Account Name; loading the whole file instead.")
+            elif not scanned[1]:
+                print(f"{file_name} has no rows; nothing to process.")
+                return
+            else:
+                dtypes, source_rows, has_special_accounts = scanned
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                output_path = reserve_output_path(output_dir, timestamp)
+                with timed_stage(timings, 'ledger', rows_in=source_rows) as stage:
+                    num_rows, report_rows = write_ledger_streaming(file_path, output_path, dtypes,
+                                                                   has_special_accounts, chunksize, as_of)
+                    stage['rows_out'] = num_rows
+                streamed = True
+        
+        if result_df is None and not streamed:
+            with timed_stage(timings, 'load') as stage:
+                try:
+                    df = read_closed_won(file_path)
+                except Exception as e:
+                    print(f"Error loading file {file_name}: {e}")
+                    return
+                
+                # Amounts are formatted for output the way the export's Amount column was read
+                amount_dtype = df['Amount'].dtype
+                source_rows = len(df)
+                if not source_rows:
+                    print(f"{file_name} has no rows; nothing to process.")
+                    return
+                df = prepare_closed_won(df)
+                stage['rows_out'] = len(df)
+            
+            # Build the ledger rows from the sorted opportunities, reusing the previous run's
+            # ledger plan for unchanged accounts when running incrementally
+            with timed_stage(timings, 'ledger', rows_in=len(df)) as stage:
+                if incremental:
+                    result_df = build_ledger_incremental(df, os.path.join(output_dir, LEDGER_STATE_FILE), as_of=as_of)
+                elif cache and shards <= 1:
+                    # Keep the plan, so later runs this month only redo the monthly expansion
+                    plan = plan_ledger(df)
+                    result_df = combine_ledger_parts(expand_ledger_plan(plan, as_of))
+                else:
+                    result_df = build_ledger(df, shards=shards, max_workers=max_workers, as_of=as_of)
+                stage['rows_out'] = len(result_df)
+        
+        if not from_cache and not streamed:
+            # Add special intermediate entries for specific accounts
+            with timed_stage(timings, 'special_entries', rows_in=len(result_df)) as stage:
+                result_df = add_special_intermediate_entries(result_df)
+                stage['rows_out'] = len(result_df)
+            
+            if cache:
+                store_cached_ledger(cache_path, result_df, amount_dtype, source_rows, as_of, plan)
+        
+        if not streamed:
+            with timed_stage(timings, 'write', rows_in=len(result_df)):
+                # Replace spaces in column names with underscores for BigQuery compatibility
+                result_df.columns = [col.replace(' ', '_') for col in result_df.columns]
+                
+                # Render the Note text for output; the report below works on the Note codes
+                result_df['Note'] = render_notes(result_df['Note_Code'], result_df['Note_Suffix'])
+                
+                # Generate timestamp for the output file
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                
+                # Create output filename (or directory for a month-partitioned tree) and save the processed data
+                if partition_by_month:
+                    output_path = reserve_output_path(output_dir, timestamp, extension=None)
+                    num_partitions = write_month_partitions(result_df, output_path, output_format, amount_dtype)
+                    print(f"Ledger split into {num_partitions} month partitions.")
+                else:
+                    output_path = reserve_output_path(output_dir, timestamp, extension=output_format)
+                
+                # Parquet output keeps the typed Date; the report below works on the CSV-formatted frame
+                if output_format == 'parquet' and not partition_by_month:
+                    write_ledger_parquet(result_df, output_path)
+                    schema_path = write_bigquery_schema(os.path.splitext(output_path)[0] + '_schema.json')
+                    print(f"BigQuery schema saved to {schema_path}")
+                
+                # Convert Date back to string format and the cents back to amounts for output
+                # (the store below keeps the exact cents)
+                amount_cents = result_df['Amount']
+                result_df['Date'] = result_df['Date'].dt.strftime('%m/%d/%Y')
+                result_df['Amount'] = cents_to_amount(amount_cents, amount_dtype)
+                
+                if output_format == 'csv' and not partition_by_month:
+                    result_df.to_csv(output_path, index=False, columns=LEDGER_OUTPUT_COLUMNS)
+            num_rows = len(result_df)
+        print(f"Processing complete. Output saved to {output_path}")
+        
+        with timed_stage(timings, 'report', rows_in=num_rows) as stage:
+            # Convert the Date back to datetime, then classify each subscription account by its most recent entry
+            if not streamed:
+                result_df['Date'] = pd.to_datetime(result_df['Date'])
+                report_rows = result_df
+            latest_entries, active_subscribers, ended_subscription_accounts = classify_subscription_accounts(report_rows)
+            report = subscription_report(latest_entries, active_subscribers, ended_subscription_accounts)
+            stage['rows_out'] = report['counts']['total']
+        
+        # Upsert the ledger into the store, replacing the rows of its accounts from earlier runs
+        if store:
+            with timed_stage(timings, 'store', rows_in=len(result_df)) as stage:
+                store_path = os.path.join(output_dir, LEDGER_STORE_FILE)
+                stage['rows_out'] = upsert_ledger_store(store_path, result_df.assign(Amount=amount_cents))
+            print(f"Ledger upserted into {store_path}")
+        
+        # Write the run report next to the ledger output and print only the summary
+        report = {'source_file': file_name, 'source_rows': source_rows, 'as_of': as_of.isoformat(),
+                  'output': output_path, **report, 'timings': timings}
+        report_paths = write_run_report(report, run_report_base(output_path), output_format)
+        print_report_summary(report)
+        print(f"Run report saved to {', '.join(report_paths)}")
+        
+        if profiling:
+            profile_path = write_stage_profile(os.path.join(output_dir, PROFILE_LOG_FILE), file_name, output_path)
+            print(f"Stage profile appended to {profile_path}")
+    finally:
+        # Also stop after an early return or an error, so later runs are not profiled
+        if profiling:
+            stop_stage_profile(started_tracing)
+    
+    # Parallel runs copy the script and archive the source once the workers finish
+    if manage_files:
+        copy_script_to_production()
+        archive_source_file(file_path, archive_dir)
+    
+    return output_path
+
+def classify_subscription_accounts(result_df):
+    """
+    Classifies the subscription accounts (Product_Code = 350-0100) of a ledger by their most
+    recent entry. Churned, inactive and swapped accounts are marked on that entry first, so they
+    count as ended subscriptions.
+    
+    Args:
+        result_df (pd.DataFrame): The ledger with underscore column names
+        
+    Returns:
+        tuple: (latest_entries, active_subscribers, ended_subscription_accounts) dataframes
+    """
+    # Filter for only subscription type accounts (Product_Code = 350-0100)
+    subscription_df = result_df[result_df['Product_Code'] == '350-0100'].reset_index(drop=True)
     
-    # Select only the required columns
-    cols_to_keep = [
-        'Account Name', 'Five9 Account Number', 'Close Date', 'Product Code', 
-        'Amount', 'Opportunity Type', 'Opportunity ID', 'Account ID', 'Account Status'
+    # Most recent entry for each account; ties and undated entries keep the earliest row
+    dates = subscription_df['Date'].fillna(pd.Timestamp.min)
+    latest_rows = dates.groupby(subscription_df['Account_Name'], sort=False, dropna=False).idxmax()
+    latest_entries = subscription_df.loc[latest_rows.to_numpy()]
+    
+    is_add = (latest_entries['Opportunity_Type'] == 'Add Products').to_numpy()
+    is_zero = (latest_entries['Amount'] == 0).to_numpy()
+    status = latest_entries['Account_Status']
+    account_name = latest_entries['Account_Name']
+    
+    # Zero-amount entries with an On Demand entry under the same Opportunity_ID were swapped to
+    # On Demand (hash join on account and opportunity)
+    on_demand = result_df[result_df['Product_Code'] == '350-0101'][['Account_Name', 'Opportunity_ID']].dropna()
+    keys = latest_entries[['Account_Name', 'Opportunity_ID']]
+    has_on_demand = (pd.MultiIndex.from_frame(keys).isin(pd.MultiIndex.from_frame(on_demand)) &
+                     keys.notna().all(axis=1).to_numpy())
+    
+    # Special cases, in order of precedence
+    overrides = [
+        (is_add & (status == 'Churned').to_numpy(), CHURNED_SUFFIX),
+        (is_add & status.isna().to_numpy(), INACTIVE_SUFFIX),
+        ((account_name == 'United Mortgage Lending').to_numpy(), ""),
+        ((account_name == 'Copart, Inc').to_numpy() & is_zero, SWAP_SUFFIX),
+        (is_zero & (status == 'Active').to_numpy() & is_add & has_on_demand &
+         (latest_entries['Note_Code'] == NOTE_NONE).to_numpy() &
+         (latest_entries['Note_Suffix'] == "").to_numpy(), SWAP_SUFFIX),
     ]
+    conditions = [condition for condition, _ in overrides]
+    overridden = np.logical_or.reduce(conditions)
+    latest_entries = latest_entries.assign(
+        Note_Code=np.where(overridden, NOTE_START_OF_SUBSCRIPTION, latest_entries['Note_Code']),
+        Note_Suffix=np.select(conditions, [suffix for _, suffix in overrides],
+                              latest_entries['Note_Suffix'].to_numpy(dtype=object))
+    )
     
-    # Check if all required columns exist in the dataframe
-    missing_cols = [col for col in cols_to_keep if col not in df.columns]
-    if missing_cols:
-        print(f"Missing columns in {file_name}: {missing_cols}")
-        return
+    # Notes of running subscriptions, and the suffixes that mark them as ended instead
+    subscription_notes = [NOTE_START_OF_SUBSCRIPTION, NOTE_SUBSCRIBED_BILLING, NOTE_REDUCTION_SUBSCRIBED_BILLING]
+    ended_suffixes = [CHURNED_SUFFIX, INACTIVE_SUFFIX, SWAP_SUFFIX]
     
-    # Filter out only the required columns
-    df = df[cols_to_keep].copy()
+    # Filter for active subscribers based on the specified conditions
+    active_subscribers = latest_entries[
+        (latest_entries['Opportunity_Type'] == 'Add Products') &
+        (latest_entries['Note_Code'].isin(subscription_notes)) &
+        (~latest_entries['Note_Suffix'].isin(ended_suffixes)) &
+        (latest_entries['Account_Status'] == 'Active')
+    ]
     
-    # Create a new 'Note' column
-    df['Note'] = ""
+    # Filter for accounts whose most recent entry shows an ended subscription
+    # Now including our special cases as ended subscriptions
+    ended_subscription_accounts = latest_entries[
+        (latest_entries['Note_Code'] == NOTE_REDUCTION_END_OF_SUBSCRIPTION) |
+        ((latest_entries['Note_Code'] == NOTE_START_OF_SUBSCRIPTION) &
+         (latest_entries['Note_Suffix'].isin(ended_suffixes)))
+    ]
     
-    # Rename 'Close Date' to 'Date'
-    df = df.rename(columns={'Close Date': 'Date'})
+    return latest_entries, active_subscribers, ended_subscription_accounts
+
+def subscription_report_rows(result_df):
+    """
+    Returns the ledger rows classify_subscription_accounts looks at: the most recent 350-0100 entry
+    of every account and one 350-0101 entry per Account_Name and Opportunity_ID. Classifying the rows
+    kept from each part of a ledger, in order, gives the same result as classifying the whole ledger.
     
-    # Convert 'Date' to datetime format
-    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    Args:
+        result_df (pd.DataFrame): Ledger rows with underscore column names and Date as datetime
+        
+    Returns:
+        pd.DataFrame: The kept rows, in ledger order
+    """
+    result_df = result_df.reset_index(drop=True)
+    subscription_df = result_df[result_df['Product_Code'] == '350-0100']
     
-    # Sort by 'Account Name', 'Product Code', then 'Date'
-    df = df.sort_values(by=['Account Name', 'Product Code', 'Date']).reset_index(drop=True)
+    # Same tie-breaking as classify_subscription_accounts: the earliest row wins
+    dates = subscription_df['Date'].fillna(pd.Timestamp.min)
+    latest_rows = dates.groupby(subscription_df['Account_Name'], sort=False, dropna=False).idxmax()
+    on_demand = result_df[result_df['Product_Code'] == '350-0101'].drop_duplicates(['Account_Name', 'Opportunity_ID'])
     
-    # Create a new dataframe to hold the processed results
-    result_df = []
+    keep = np.zeros(len(result_df), dtype=bool)
+    keep[latest_rows.to_numpy(dtype='int64')] = True
+    keep[on_demand.index.to_numpy()] = True
+    return result_df[keep]
+
+def subscription_report(latest_entries, active_subscribers, ended_subscription_accounts):
+    """
+    Builds the subscription section of the run report from the classified accounts.
     
-    # Identify duplicate records
-    duplicate_indices = []
-    for i in range(1, len(df)):
-        curr = df.iloc[i]
-        prev = df.iloc[i-1]
+    Args:
+        latest_entries (pd.DataFrame): Most recent entry of every subscription account
+        active_subscribers (pd.DataFrame): Latest entries of the active subscribers
+        ended_subscription_accounts (pd.DataFrame): Latest entries of the ended subscriptions
         
-        # Check for duplicate records (same account, product, opportunity ID, and amount)
-        if (curr['Account Name'] == prev['Account Name'] and 
-            curr['Product Code'] == prev['Product Code'] and 
-            curr['Opportunity ID'] == prev['Opportunity ID'] and
-            curr['Amount'] == prev['Amount']):
-            duplicate_indices.append(i)
+    Returns:
+        dict: Counts, sorted account lists per category, the other-status details and the
+        multiple-subscription mapping (base account -> its subscriptions)
+    """
+    active_accounts = sorted(active_subscribers['Account_Name'].unique())
+    ended_accounts = sorted(ended_subscription_accounts['Account_Name'].unique())
     
-    # Group by Account Name and Product Code to find single-entry active accounts
-    account_groups = df.groupby(['Account Name', 'Product Code'])
-    single_entry_active_accounts = []
+    # Accounts that are neither active subscribers nor ended subscriptions, with their current state
+    other_status = latest_entries[~latest_entries['Account_Name'].isin(active_accounts + ended_accounts)]
+    other_status = other_status.sort_values('Account_Name')
+    other_status_accounts = [
+        {'account': account, 'note': render_note(note, suffix),
+         'opportunity_type': report_value(opportunity_type), 'account_status': report_value(account_status)}
+        for account, note, suffix, opportunity_type, account_status in zip(
+            other_status['Account_Name'], other_status['Note_Code'], other_status['Note_Suffix'],
+            other_status['Opportunity_Type'], other_status['Account_Status'])
+    ]
     
-    for (account_name, product_code), group in account_groups:
-        if (len(group) == 1 and 
-            product_code == '350-0100' and 
-            group['Opportunity Type'].iloc[0] == 'Add Products' and
-            group['Account Status'].iloc[0] == 'Active'):
-            single_entry_active_accounts.append((account_name, product_code))
+    # Accounts with multiple subscriptions, with all variants (base and with suffixes)
+    subscriptions_by_account = group_subscriptions(active_accounts)
+    multiple_subscriptions = {account: sorted(subscriptions_by_account[account])
+                              for account in sorted(subscriptions_by_account)}
+    
+    counts = {
+        'active': len(active_accounts),
+        'ended': len(ended_accounts),
+        'other_status': len(other_status_accounts),
+        'total': len(active_accounts) + len(ended_accounts) + len(other_status_accounts),
+        'multiple_subscriptions': len(multiple_subscriptions),
+    }
+    
+    return {
+        'counts': counts,
+        'active_subscribers': active_accounts,
+        'ended_subscriptions': ended_accounts,
+        'other_status': other_status_accounts,
+        'multiple_subscriptions': multiple_subscriptions,
+    }
+
+def report_value(value):
+    """
+    Returns a report value as a string, or None when it is missing.
+    """
+    return None if pd.isna(value) else str(value)
+
+def write_run_report(report, report_base, output_format='csv'):
+    """
+    Writes the run report as JSON. Parquet runs also get the report as a Parquet table with one
+    row per subscription account.
+    
+    Args:
+        report (dict): The run report
+        report_base (str): Report path without extension
+        output_format (str): 'csv' or 'parquet', the format of the ledger output
+        
+    Returns:
+        list: Paths of the report files
+    """
+    report_paths = [report_base + '.json']
+    with open(report_paths[0], 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    
+    if output_format == 'parquet':
+        report_paths.append(report_base + '.parquet')
+        run_report_frame(report).to_parquet(report_paths[1], index=False)
+    
+    return report_paths
+
+def run_report_frame(report):
+    """
+    Flattens a run report into one row per subscription account. The counts and timings are
+    repeated on every row, so each Parquet report stands on its own.
+    """
+    multiple_subscription_of = {subscription: account
+                                for account, subscriptions in report['multiple_subscriptions'].items()
+                                for subscription in subscriptions}
+    other_status = {entry['account']: entry for entry in report['other_status']}
+    
+    accounts = ([(account, 'active') for account in report['active_subscribers']] +
+                [(account, 'ended') for account in report['ended_subscriptions']] +
+                [(account, 'other_status') for account in other_status])
+    frame = pd.DataFrame({
+        'Account_Name': [account for account, _ in accounts],
+        'Category': [category for _, category in accounts],
+        'Note': [other_status.get(account, {}).get('note') for account, _ in accounts],
+        'Opportunity_Type': [other_status.get(account, {}).get('opportunity_type') for account, _ in accounts],
+        'Account_Status': [other_status.get(account, {}).get('account_status') for account, _ in accounts],
+        'Multiple_Subscription_Of': [multiple_subscription_of.get(account) for account, _ in accounts],
+    }, dtype=object)
+    frame['Source_File'] = report['source_file']
+    frame['Output'] = report['output']
+    for stage, seconds in report['timings'].items():
+        frame[f'Seconds_{stage}'] = seconds
+    
+    return frame
+
+def print_report_summary(report):
+    """
+    Prints the counts of the run report to the terminal.
+    """
+    counts = report['counts']
+    print("\n" + "="*50)
+    print(f"Number of active subscribers (Product_Code = 350-0100): {counts['active']}")
+    print(f"Number of accounts with ended subscriptions (Product_Code = 350-0100): {counts['ended']}")
+    print(f"Number of subscription accounts with other status (Product_Code = 350-0100): {counts['other_status']}")
+    print(f"Total subscription accounts across all categories: {counts['total']}")
+    print(f"Number of accounts with multiple subscriptions: {counts['multiple_subscriptions']}")
+    print("="*50 + "\n")
+
+@contextlib.contextmanager
+def timed_stage(timings, stage, rows_in=None):
+    """
+    Records the wall time of a pipeline stage (in seconds) under its name. While profiling, the
+    stage is also added to the stage profile with its tracemalloc and peak RSS figures and row counts.
+    
+    Args:
+        timings (dict): Wall time per stage for the run report, or None for profile-only stages
+        stage (str): Stage name
+        rows_in (int, optional): Number of rows going into the stage
+        
+    Yields:
+        dict: The stage record; set 'rows_out' on it to record the rows coming out
+    """
+    record = {'stage': stage, 'rows_in': rows_in, 'rows_out': None}
+    profiling = stage_profile is not None
+    if profiling:
+        record.update(begin_profiled_stage(stage))
+    
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        seconds = time.perf_counter() - started
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0) + seconds, 6)
+        if profiling:
+            end_profiled_stage(record, seconds)
+
+def profiling_requested():
+    """
+    Returns True when profiling is turned on through the PROFILE_ENV_VAR environment variable.
+    """
+    return os.environ.get(PROFILE_ENV_VAR, '').strip().lower() not in ('', '0', 'false', 'no')
+
+def start_stage_profile():
+    """
+    Starts a new stage profile and memory tracing for the current run.
+    
+    Returns:
+        bool: True if this call started tracemalloc (see stop_stage_profile)
+    """
+    global stage_profile
+    stage_profile = {'stages': [], 'open': []}
+    if tracemalloc.is_tracing():
+        return False
+    
+    tracemalloc.start()
+    return True
+
+def stop_stage_profile(started_tracing):
+    """
+    Ends the stage profile of the current run, and stops tracemalloc if start_stage_profile started it.
+    """
+    global stage_profile
+    stage_profile = None
+    if started_tracing:
+        tracemalloc.stop()
+
+def begin_profiled_stage(stage):
+    """
+    Opens a profiled stage. Stages can be nested (the ledger stage contains the engine's stages),
+    so the peak traced memory of the enclosing stage is saved before the peak is reset.
+    
+    Returns:
+        dict: Starting figures for end_profiled_stage
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    open_stages = stage_profile['open']
+    if open_stages:
+        open_stages[-1]['peak_traced'] = max(open_stages[-1]['peak_traced'], peak)
+    tracemalloc.reset_peak()
+    
+    figures = {'parent': open_stages[-1]['stage'] if open_stages else None,
+               'start_traced': current, 'start_rss': peak_rss_bytes()}
+    open_stages.append({'stage': stage, 'peak_traced': current})
+    return figures
+
+def end_profiled_stage(record, seconds):
+    """
+    Closes a profiled stage and adds its record to the stage profile.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    open_stage = stage_profile['open'].pop()
+    peak = max(peak, open_stage['peak_traced'])
+    
+    # The enclosing stage's peak includes this one
+    if stage_profile['open']:
+        stage_profile['open'][-1]['peak_traced'] = max(stage_profile['open'][-1]['peak_traced'], peak)
+    
+    start_traced = record.pop('start_traced')
+    start_rss = record.pop('start_rss')
+    end_rss = peak_rss_bytes()
+    record.update({
+        'seconds': round(seconds, 6),
+        'traced_delta_bytes': current - start_traced,
+        'traced_peak_bytes': peak - start_traced,
+        'peak_rss_bytes': end_rss,
+        'peak_rss_growth_bytes': None if end_rss is None or start_rss is None else end_rss - start_rss,
+    })
+    stage_profile['stages'].append(record)
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process in bytes, or None when it can't be read.
+    Uses psutil when it is installed, otherwise the resource module (not available on Windows).
+    """
+    if importlib.util.find_spec('psutil') is not None:
+        import psutil
+        memory = psutil.Process().memory_info()
+        # Windows reports the peak working set; elsewhere psutil only has the current RSS
+        return getattr(memory, 'peak_wset', memory.rss)
+    
+    try:
+        import resource
+    except ImportError:
+        return None
+    
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+def write_stage_profile(log_path, file_name, output_path):
+    """
+    Appends the stage profile of the current run to the JSON log.
+    
+    Args:
+        log_path (str): Path of the JSON lines profile log
+        file_name (str): Name of the processed export
+        output_path (str): Path of the ledger output
+        
+    Returns:
+        str: Path of the profile log
+    """
+    entry = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'source_file': file_name,
+        'output': output_path,
+        'engine_version': ledger_engine_version(),
+        'stages': stage_profile['stages'],
+    }
+    
+    # One line per run, written in a single call so parallel workers don't interleave
+    with open(log_path, 'a') as log_file:
+        log_file.write(json.dumps(entry) + '\n')
+    
+    return log_path
+
+def reserve_output_path(output_dir, timestamp, extension='csv'):
+    """
+    Claims a unique Quick_Assist_Ledger_Output file name for this run. Outputs written within
+    the same second (e.g. by parallel workers) get a numeric suffix instead of overwriting each other.
+    
+    Args:
+        output_dir (str): Directory for the output file
+        timestamp (str): Run timestamp (YYYYMMDD_HHMMSS)
+        extension (str): File extension, or None to claim a directory
+        
+    Returns:
+        str: Path of the newly created, empty output file or directory
+    """
+    attempt = 1
+    while True:
+        suffix = f"_{attempt}" if attempt > 1 else ""
+        output_path = os.path.join(output_dir, f'Quick_Assist_Ledger_Output_{timestamp}{suffix}')
+        try:
+            # Exclusive create, so two processes can never claim the same name
+            if extension is None:
+                os.mkdir(output_path)
+            else:
+                output_path = f'{output_path}.{extension}'
+                with open(output_path, 'x'):
+                    pass
+            return output_path
+        except FileExistsError:
+            attempt += 1
+
+def write_month_partitions(result_df, output_path, output_format='csv', amount_dtype=np.dtype('float64')):
+    """
+    Writes the ledger as a Hive-style month=YYYY-MM/ directory tree, so downstream loads and
+    queries can prune to the months they need. Every partition gets a manifest.json with its row
+    count and Amount total. Rows without a Date go to the Hive default partition.
+    
+    Args:
+        result_df (pd.DataFrame): The final ledger with BigQuery column names, a datetime Date and
+            Amount in cents
+        output_path (str): Root directory of the tree
+        output_format (str): 'csv' or 'parquet' for the partition files
+        amount_dtype (numpy.dtype): dtype of the export's Amount column, for CSV amounts (see cents_to_amount)
+        
+    Returns:
+        int: Number of partitions written
+    """
+    months = result_df['Date'].dt.strftime('%Y-%m').fillna(HIVE_DEFAULT_PARTITION)
+    amounts = cents_to_amount(result_df['Amount'], amount_dtype)
+    
+    # groupby keeps the ledger order within each month
+    num_partitions = 0
+    for month, partition in result_df.groupby(months, sort=True):
+        partition_dir = os.path.join(output_path, f'month={month}')
+        os.makedirs(partition_dir)
+        
+        file_name = f'ledger.{output_format}'
+        if output_format == 'parquet':
+            write_ledger_parquet(partition, os.path.join(partition_dir, file_name))
+        else:
+            partition.assign(Date=partition['Date'].dt.strftime('%m/%d/%Y'),
+                             Amount=amounts[partition.index]).to_csv(
+                os.path.join(partition_dir, file_name), index=False, columns=LEDGER_OUTPUT_COLUMNS)
+        
+        # Totals are summed in exact cents
+        cents = partition['Amount']
+        manifest = {
+            'month': month,
+            'file': file_name,
+            'rows': len(partition),
+            'amount_total': str(decimal.Decimal(int(cents.sum())).scaleb(-2)),
+            'rows_without_amount': int(cents.isna().sum()),
+        }
+        with open(os.path.join(partition_dir, 'manifest.json'), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        num_partitions += 1
+    
+    if output_format == 'parquet':
+        write_bigquery_schema(os.path.join(output_path, 'schema.json'))
+    
+    return num_partitions
+
+def amount_decimals(cents):
+    """
+    Converts ledger cents to exact decimals (None for missing amounts).
+    """
+    return [None if pd.isna(value) else decimal.Decimal(int(value)).scaleb(-2) for value in cents]
+
+def write_ledger_parquet(result_df, output_path):
+    """
+    Writes the ledger as a Parquet file with the typed columns of LEDGER_BIGQUERY_SCHEMA, so load
+    jobs don't have to parse CSV text. Requires pyarrow.
+    
+    Args:
+        result_df (pd.DataFrame): The final ledger with BigQuery column names, a datetime Date and
+            Amount in cents
+        output_path (str): Path of the Parquet file
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    arrays = []
+    for column, bigquery_type in LEDGER_BIGQUERY_SCHEMA:
+        values = result_df[column]
+        if bigquery_type == 'DATE':
+            array = pa.array(values.dt.normalize(), from_pandas=True).cast(pa.date32())
+        elif bigquery_type == 'NUMERIC':
+            # Exact decimals from the cents (NUMERIC has 9 decimal places)
+            array = pa.array(amount_decimals(values), type=pa.decimal128(38, 9))
+        elif bigquery_type == 'INTEGER':
+            array = pa.array(pd.to_numeric(values).astype('Int64'), from_pandas=True)
+        else:
+            strings = values.astype(object).where(values.isna(), values.astype(str))
+            array = pa.array(strings, type=pa.string(), from_pandas=True)
+            # Names, codes and Notes repeat a lot, so they are dictionary encoded
+            if column not in ['Opportunity_ID', 'Account_ID']:
+                array = array.dictionary_encode()
+        arrays.append(array)
+    
+    table = pa.Table.from_arrays(arrays, names=[column for column, _ in LEDGER_BIGQUERY_SCHEMA])
+    pq.write_table(table, output_path)
+
+def write_bigquery_schema(schema_path):
+    """
+    Writes the BigQuery schema JSON of the ledger columns, for `bq load --source_format=PARQUET`.
+    
+    Returns:
+        str: Path of the schema JSON file
+    """
+    with open(schema_path, 'w') as schema_file:
+        json.dump([{'name': column, 'type': bigquery_type, 'mode': 'NULLABLE'}
+                   for column, bigquery_type in LEDGER_BIGQUERY_SCHEMA], schema_file, indent=2)
+    
+    return schema_path
+
+def upsert_ledger_store(store_path, result_df):
+    """
+    Upserts a ledger into the ledger store, keyed by LEDGER_STORE_KEY, with indexes on the account,
+    the base account and the month. Each export is a full snapshot of its accounts, so rows of these
+    accounts (and of their subscriptions) from earlier runs that are not in this ledger (e.g. billing
+    months removed by a later Reduction) are deleted in the same transaction.
+    
+    Args:
+        store_path (str): Path of the SQLite database (created if missing)
+        result_df (pd.DataFrame): Ledger with the output columns, Date as datetime and Amount in cents
+        
+    Returns:
+        int: Number of ledger rows upserted
+    """
+    rows = result_df[LEDGER_OUTPUT_COLUMNS].rename(columns={'Amount': 'Amount_Cents'})
+    rows['Amount_Cents'] = rows['Amount_Cents'].astype('Int64')
+    rows['Date'] = rows['Date'].dt.strftime('%Y-%m-%d')
+    rows['Month'] = rows['Date'].str[:7]
+    
+    # Missing key values are stored as empty text, so the upsert matches them on the next run
+    for column in LEDGER_STORE_KEY[:-1]:
+        rows[column] = rows[column].astype(object).fillna('')
+    rows['Entry'] = rows.groupby(LEDGER_STORE_KEY[:-1], sort=False).cumcount()
+    rows['Account_Family'] = rows['Account_Name'].map(
+        {account_name: account_family(account_name) for account_name in rows['Account_Name'].unique()})
+    
+    columns = list(rows.columns)
+    column_types = dict(LEDGER_BIGQUERY_SCHEMA, Amount_Cents='INTEGER', Month='STRING', Entry='INTEGER',
+                        Account_Family='STRING')
+    column_list = ', '.join(columns)
+    key_list = ', '.join(LEDGER_STORE_KEY)
+    key_match = ' AND '.join(f"ledger.{column} = staged.{column}" for column in LEDGER_STORE_KEY)
+    
+    # Other missing values are stored as NULL
+    values = rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    
+    # Workers of a parallel run wait for each other's transactions
+    connection = sqlite3.connect(store_path, timeout=300)
+    try:
+        with connection:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS ledger "
+                               f"({', '.join(f'{column} {LEDGER_STORE_TYPES[column_types[column]]}' for column in columns)}, "
+                               f"PRIMARY KEY ({key_list}))")
+            connection.execute("CREATE INDEX IF NOT EXISTS ledger_account ON ledger (Account_Name)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ledger_account_family ON ledger (Account_Family)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ledger_month ON ledger (Month)")
+            
+            connection.execute(f"CREATE TEMP TABLE staged AS SELECT {column_list} FROM ledger WHERE 0")
+            connection.executemany(f"INSERT INTO staged VALUES ({', '.join('?' * len(columns))})", values)
+            connection.execute(f"CREATE INDEX temp.staged_key ON staged ({key_list})")
+            connection.execute(f"INSERT INTO ledger SELECT {column_list} FROM staged WHERE true "
+                               f"ON CONFLICT ({key_list}) DO UPDATE SET "
+                               f"{', '.join(f'{column} = excluded.{column}' for column in columns if column not in LEDGER_STORE_KEY)}")
+            connection.execute(f"DELETE FROM ledger WHERE Account_Family IN (SELECT Account_Family FROM staged) "
+                               f"AND NOT EXISTS (SELECT 1 FROM staged WHERE {key_match})")
+            connection.execute("DROP TABLE staged")
+    finally:
+        connection.close()
+    
+    return len(rows)
+
+def copy_script_to_production():
+    """
+    Copies the current script to the production QuickAssist_Ledger folder.
+    """
+    # Copy the current script to the destination folder
+    script_dest_folder = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Revenue Dashboard\QuickAssist_Ledger"
+    try:
+        # Get the current script path
+        current_script_path = os.path.abspath(__file__)
+        script_filename = os.path.basename(current_script_path)
+        
+        # Create the destination folder if it doesn't exist
+        if not os.path.exists(script_dest_folder):
+            os.makedirs(script_dest_folder)
+            print(f"Created directory: {script_dest_folder}")
+        
+        # Copy the script to the destination
+        dest_script_path = os.path.join(script_dest_folder, script_filename)
+        shutil.copy2(current_script_path, dest_script_path)
+        print(f"Script copied to: {dest_script_path}")
+    except Exception as e:
+        print(f"Error copying script to destination folder: {e}")
+
+def archive_source_file(file_path, archive_dir):
+    """
+    Moves a processed source file to the archive directory.
+    """
+    # Move the source file to the archive directory
+    try:
+        archive_path = os.path.join(archive_dir, os.path.basename(file_path))
+        shutil.move(file_path, archive_path)
+        print(f"Source file moved to: {archive_path}")
+    except Exception as e:
+        print(f"Error moving source file to archive: {e}")
+
+def new_exports(csv_files, archive_dir, as_of):
+    """
+    Filters out the exports whose contents were already processed for this as-of date, before
+    any of them is parsed.
+    
+    An export already in the archive manifest is linked to the existing output in the manifest
+    and archived. A second copy within the same batch is left in place for the next run, which
+    archives it once the first copy has been processed.
+    
+    Args:
+        csv_files (list): Paths of the input CSV files
+        archive_dir (str): Directory the processed source files are moved to
+        as_of (date): The as-of date of this run
+        
+    Returns:
+        tuple: (paths of the exports to process, content hash by path)
+    """
+    manifest = load_archive_manifest(archive_dir)
+    content_hashes = {}
+    new_files = []
+    for file_path in csv_files:
+        file_name = os.path.basename(file_path)
+        content_hash = file_content_hash(file_path)
+        processed = manifest.get(content_hash)
+        
+        if processed is not None and processed['as_of'] == as_of.isoformat():
+            print(f"Skipping {file_name}: same contents as {processed['file']}, "
+                  f"already processed to {processed['output']}")
+            archive_source_file(file_path, archive_dir)
+            processed.setdefault('duplicates', []).append(
+                {'file': file_name, 'seen_at': datetime.now().isoformat(timespec='seconds')})
+            save_archive_manifest(archive_dir, manifest)
+        elif content_hash in content_hashes.values():
+            print(f"Skipping {file_name}: same contents as another export in this run")
+        else:
+            content_hashes[file_path] = content_hash
+            new_files.append(file_path)
+    
+    return new_files, content_hashes
+
+def load_archive_manifest(archive_dir):
+    """
+    Loads the manifest of processed exports from the archive directory.
+    
+    Returns:
+        dict: Manifest entry (file, rows, output, as_of, processed_at) by content hash
+    """
+    manifest_path = os.path.join(archive_dir, ARCHIVE_MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    
+    with open(manifest_path) as manifest_file:
+        return json.load(manifest_file)
+
+def save_archive_manifest(archive_dir, manifest):
+    """
+    Writes the manifest of processed exports, replacing the previous one in a single step.
+    """
+    manifest_path = os.path.join(archive_dir, ARCHIVE_MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def record_processed_export(archive_dir, content_hash, file_path, output_path):
+    """
+    Records a processed export in the archive manifest, with the row count and as-of date from
+    its run report.
+    
+    Args:
+        archive_dir (str): Directory the processed source files are moved to
+        content_hash (str): Content hash of the export (file_content_hash)
+        file_path (str): Path of the export
+        output_path (str): Path of the ledger output
+    """
+    with open(run_report_base(output_path) + '.json') as report_file:
+        report = json.load(report_file)
+    
+    manifest = load_archive_manifest(archive_dir)
+    manifest[content_hash] = {
+        'file': os.path.basename(file_path),
+        'rows': report['source_rows'],
+        'output': output_path,
+        'as_of': report['as_of'],
+        'processed_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    save_archive_manifest(archive_dir, manifest)
+
+def run_report_base(output_path):
+    """
+    Returns the path (without extension) of the run report written next to a ledger output.
+    """
+    return os.path.splitext(output_path)[0] + '_report'
+
+def read_closed_won(file_path, **options):
+    """
+    Reads the ledger columns of a Closed Won export with the declared ingest types, using the
+    pyarrow CSV engine when it is installed.
+    
+    Args:
+        file_path (str): Path of the Closed Won export
+        **options: Extra pd.read_csv arguments (chunksize forces the default engine)
+        
+    Returns:
+        pd.DataFrame: The export's ledger columns (or an iterator of chunks with chunksize)
+    """
+    engine = csv_engine() if 'chunksize' not in options else 'c'
+    return pd.read_csv(file_path, usecols=CLOSED_WON_COLUMNS, dtype=CLOSED_WON_DTYPES, engine=engine, **options)
+
+def amount_to_cents(amounts):
+    """
+    Converts amounts to exact int64 cents (nullable, so missing amounts stay missing).
+    Amounts finer than a cent are rounded to the cent.
+    
+    Args:
+        amounts (pd.Series): Amounts as read from the export
+        
+    Returns:
+        pd.Series: Amounts in cents with the 'Int64' dtype
+    """
+    amounts = pd.to_numeric(amounts)
+    cents = (amounts * 100).round()
+    
+    # 12.34 * 100 is not exactly 1234.0, so compare on the way back instead
+    num_rounded = int((cents / 100 != amounts).sum() - amounts.isna().sum())
+    if num_rounded:
+        print(f"Rounded {num_rounded} amounts finer than a cent to the nearest cent.")
+    
+    return cents.astype('Int64')
+
+def cents_to_amount(cents, amount_dtype):
+    """
+    Converts ledger cents back to amounts for output. Whole amounts stay integers when the export's
+    Amount column was read as integers, otherwise the amounts are floats, as the export had them.
+    
+    Args:
+        cents (pd.Series): Ledger amounts in cents
+        amount_dtype (numpy.dtype): dtype of the Amount column as read from the export
+        
+    Returns:
+        pd.Series: Amounts in currency units
+    """
+    cents = pd.Series(cents, dtype='Int64')
+    if (pd.api.types.is_integer_dtype(amount_dtype) and not cents.isna().any() and
+            (cents % 100 == 0).all()):
+        return (cents // 100).astype('int64')
+    
+    return cents.astype('float64') / 100
+
+def csv_engine():
+    """
+    Returns 'pyarrow' if pyarrow is installed, otherwise pandas' default 'c' CSV engine.
+    """
+    return 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+
+def parse_close_dates(dates):
+    """
+    Parses Close Dates in the export's MM/DD/YYYY format. Dates in any other format become NaT.
+    
+    Args:
+        dates (pd.Series): Close Dates as text
+        
+    Returns:
+        pd.Series: The dates as datetime64
+    """
+    parsed = pd.to_datetime(dates, format=CLOSE_DATE_FORMAT, errors='coerce')
+    
+    num_unparsed = int((parsed.isna() & dates.notna()).sum())
+    if num_unparsed:
+        print(f"{num_unparsed} Close Dates are not in MM/DD/YYYY format and were left empty.")
+    
+    return parsed
+
+def prepare_closed_won(df):
+    """
+    Keeps the ledger columns of a Closed Won export, adds empty Note fields, parses the
+    Close Date into Date and sorts by Account Name, Product Code and Date.
+    
+    Args:
+        df (pd.DataFrame): The Closed Won export (or a batch of whole accounts from it)
+        
+    Returns:
+        pd.DataFrame: The sorted dataframe the ledger engines work on
+    """
+    # Filter out only the required columns
+    df = df[CLOSED_WON_COLUMNS].copy()
+    
+    # Create the Note fields (enum code and suffix)
+    df['Note Code'] = NOTE_NONE
+    df['Note Suffix'] = ""
+    
+    # Rename 'Close Date' to 'Date'
+    df = df.rename(columns={'Close Date': 'Date'})
+    
+    # Convert 'Date' to datetime format
+    df['Date'] = parse_close_dates(df['Date'])
+    
+    # The ledger engines work on exact integer cents
+    df['Amount'] = amount_to_cents(df['Amount'])
+    
+    # Sort by 'Account Name', 'Product Code', then 'Date'
+    return df.sort_values(by=['Account Name', 'Product Code', 'Date']).reset_index(drop=True)
+
+def scan_sorted_export(file_path, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Reads the STREAM_SCAN_COLUMNS of an export in chunks, to check that it can be streamed before
+    any output is written.
+    
+    Args:
+        file_path (str): Path of the Closed Won export
+        chunksize (int): Rows read per chunk
+        
+    Returns:
+        tuple: (dtype of the numeric columns over the whole export, number of rows (0 for a
+               header-only export), whether any of the SPECIAL_ENTRY_ACCOUNTS is in it), or None if
+               the file is not sorted by Account Name
+    """
+    dtypes = {}
+    source_rows = 0
+    has_special_accounts = False
+    last_account = None
+    
+    for chunk in pd.read_csv(file_path, usecols=STREAM_SCAN_COLUMNS, dtype={'Account Name': str},
+                             chunksize=chunksize):
+        if chunk.empty:
+            continue
+        
+        # Each account must appear in one contiguous, ascending run
+        accounts = chunk['Account Name']
+        if (accounts.isna().any() or not accounts.is_monotonic_increasing or
+                (last_account is not None and accounts.iloc[0] < last_account)):
+            return None
+        last_account = accounts.iloc[-1]
+        source_rows += len(chunk)
+        has_special_accounts = has_special_accounts or bool(accounts.isin(SPECIAL_ENTRY_ACCOUNTS).any())
+        
+        # Numbers are whole only if they are in every chunk
+        for col in STREAM_SCAN_COLUMNS[1:]:
+            dtypes[col] = np.result_type(dtypes[col], chunk[col].dtype) if col in dtypes else chunk[col].dtype
+    
+    return dtypes, source_rows, has_special_accounts
+
+def write_ledger_streaming(file_path, output_path, dtypes, sort_by_account=False, chunksize=STREAM_CHUNK_ROWS,
+                           as_of=None):
+    """
+    Builds the ledger of an export sorted by Account Name (see scan_sorted_export) one batch of
+    accounts at a time, appending each batch's ledger rows to the output CSV straight away.
+    
+    Rows of the last account in a chunk are held back until the account is complete. Between
+    batches only the multiple-subscription billing intervals (their rows come last), the rows
+    the subscription report needs (see subscription_report_rows) and, with sort_by_account, the
+    rows a later account can still sort before are kept. The output is the same as a full load.
+    
+    Args:
+        file_path (str): Path of the Closed Won export
+        output_path (str): The reserved output CSV
+        dtypes (dict): dtype of the numeric columns over the whole export, from scan_sorted_export
+        sort_by_account (bool): Add the special intermediate entries and sort the ledger by Account
+            Name and Date, as add_special_intermediate_entries does (when the export has the accounts)
+        chunksize (int): Rows read per chunk, and ledger rows written per chunk
+        as_of (date, optional): Last billing date (defaults to today)
+        
+    Returns:
+        tuple: (number of ledger rows written, the ledger rows for classify_subscription_accounts)
+    """
+    amount_dtype = dtypes['Amount']
+    rewrite_amounts = False
+    num_rows = 0
+    report_parts = []
+    multiple_subscription_intervals = []
+    empty_plan = None
+    held_rows = None
+    num_batches = 0
+    
+    def write(rows):
+        nonlocal amount_dtype, rewrite_amounts, num_rows
+        if not len(rows):
+            return
+        rows = rows.reset_index(drop=True)
+        rows.columns = [col.replace(' ', '_') for col in rows.columns]
+        rows['Note'] = render_notes(rows['Note_Code'], rows['Note_Suffix'])
+        
+        # Account numbers are floats in every batch if they are anywhere in the export
+        if (pd.api.types.is_float_dtype(dtypes['Five9 Account Number']) and
+                pd.api.types.is_integer_dtype(rows['Five9_Account_Number'])):
+            rows['Five9_Account_Number'] = rows['Five9_Account_Number'].astype('float64')
+        
+        # The first batch that needs float amounts switches the rest of the ledger to floats, and the
+        # batches already written with whole amounts are rewritten at the end
+        amounts = cents_to_amount(rows['Amount'], amount_dtype)
+        if pd.api.types.is_integer_dtype(amount_dtype) and not pd.api.types.is_integer_dtype(amounts):
+            rewrite_amounts = num_rows > 0
+            amount_dtype = amounts.dtype
+        rows['Amount'] = amounts
+        rows['Date'] = rows['Date'].dt.strftime('%m/%d/%Y')
+        
+        rows.to_csv(output_path, mode='w' if num_rows == 0 else 'a', header=num_rows == 0, index=False,
+                    columns=LEDGER_OUTPUT_COLUMNS)
+        num_rows += len(rows)
+        
+        # The report works on the written Dates, as in process_file
+        report_parts.append(subscription_report_rows(rows.assign(Date=pd.to_datetime(rows['Date']))))
+    
+    def flush(batch, next_account):
+        nonlocal empty_plan, held_rows, num_batches
+        plan = plan_ledger(prepare_closed_won(batch))
+        num_batches += 1
+        
+        if not sort_by_account:
+            # The multiple-subscription billing rows follow all account rows, as in build_ledger
+            multiple_subscription_intervals.append(plan['multiple_subscription_intervals'])
+            empty_plan = {'rows': plan['rows'].iloc[:0].copy(), 'intervals': plan['intervals'].iloc[:0].copy()}
+            account_plan = {**plan, 'multiple_subscription_intervals': empty_plan['intervals']}
+            for rows in iter_ledger_plan(account_plan, as_of, chunksize):
+                write(rows)
+            return
+        
+        account_rows, multiple_subscription_rows = expand_ledger_plan(plan, as_of)
+        special_rows = special_intermediate_entries(combine_ledger_parts([account_rows, multiple_subscription_rows]))
+        
+        # Rows with the same Account Name and Date keep their order in the whole ledger: account
+        # rows, then multiple-subscription rows, then special entries, each in batch order
+        parts = [rows.assign(_part=part, _batch=num_batches)
+                 for part, rows in enumerate([account_rows, multiple_subscription_rows, special_rows])]
+        rows = combine_ledger_parts(([held_rows] if held_rows is not None else []) + parts)
+        rows = rows.sort_values(by=['Account Name', 'Date', '_part', '_batch'])
+        
+        # Later accounts sort at or after the next batch's first account, but a subscription
+        # suffix (e.g. Name_2) can sort after it, so those rows wait for later batches
+        ready = np.ones(len(rows), dtype=bool)
+        if next_account is not None:
+            ready = (rows['Account Name'] < next_account).to_numpy()
+        held_rows = rows[~ready] if not ready.all() else None
+        rows = rows[ready].drop(columns=['_part', '_batch'])
+        for lo in range(0, len(rows), chunksize):
+            write(rows.iloc[lo:lo + chunksize])
+    
+    pending = None
+    for chunk in read_closed_won(file_path, chunksize=chunksize):
+        if chunk.empty:
+            continue
+        if pending is not None and len(pending):
+            chunk = pd.concat([pending, chunk], ignore_index=True)
+        
+        # The last account of the chunk may continue in the next one
+        accounts = chunk['Account Name']
+        complete = (accounts != accounts.iloc[-1]).to_numpy()
+        pending = chunk[~complete]
+        if complete.any():
+            flush(chunk[complete], accounts.iloc[-1])
+    
+    if pending is not None and len(pending):
+        flush(pending, None)
+    
+    if not sort_by_account:
+        intervals = combine_ledger_parts(multiple_subscription_intervals)
+        for rows in iter_ledger_plan({**empty_plan, 'multiple_subscription_intervals': intervals}, as_of, chunksize):
+            write(rows)
+    
+    if rewrite_amounts:
+        rewrite_float_amounts(output_path, chunksize)
+    
+    return num_rows, combine_ledger_parts(report_parts)
+
+def rewrite_float_amounts(output_path, chunksize=STREAM_CHUNK_ROWS):
+    """
+    Rewrites the Amount column of a ledger CSV as floats, one chunk at a time. Used when the
+    first batches of a streamed ledger were written with whole amounts before a later batch
+    needed floats (e.g. a Duplicate row without an amount).
+    
+    Args:
+        output_path (str): The ledger CSV
+        chunksize (int): Rows rewritten per chunk
+    """
+    temp_path = output_path + '.tmp'
+    for i, chunk in enumerate(pd.read_csv(output_path, dtype=str, keep_default_na=False, chunksize=chunksize)):
+        chunk['Amount'] = pd.to_numeric(chunk['Amount'].replace('', np.nan)).astype('float64')
+        chunk.to_csv(temp_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    os.replace(temp_path, output_path)
+
+def build_ledger(df, shards=1, max_workers=None, as_of=None):
+    """
+    Builds the ledger rows (before the special account entries) from the sorted opportunities.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe with empty Note fields
+        shards (int): Number of account shards to process in worker processes
+        max_workers (int, optional): Number of worker processes for shards > 1
+        as_of (date, optional): Last billing date (defaults to today)
+        
+    Returns:
+        pd.DataFrame: The ledger in output order
+    """
+    if shards > 1 and len(df):
+        return build_ledger_sharded(df, shards, max_workers, as_of)
+    
+    return combine_ledger_parts(build_ledger_parts(df, as_of))
+
+def find_single_entry_active_accounts(df):
+    """
+    Returns the (Account Name, Product Code) pairs whose only entry is an active 350-0100 Add Products.
+    """
+    # Group by Account Name and Product Code to find single-entry active accounts
+    account_groups = df.groupby(['Account Name', 'Product Code'], observed=True)
+    single_entry_active_accounts = set()
+    
+    for (account_name, product_code), group in account_groups:
+        if (len(group) == 1 and 
+            product_code == '350-0100' and 
+            group['Opportunity Type'].iloc[0] == 'Add Products' and
+            group['Account Status'].iloc[0] == 'Active'):
+            single_entry_active_accounts.add((account_name, product_code))
+    
+    return single_entry_active_accounts
+
+def build_ledger_parts(df, as_of=None):
+    """
+    Runs the grouped engine and returns the ledger in two parts: the rows in account order, and the
+    Subscribed Billing rows of the accounts with multiple subscriptions, which the ledger lists last.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe (or a shard of whole accounts)
+        as_of (date, optional): Last billing date (defaults to today)
+        
+    Returns:
+        tuple: (account rows, multiple-subscription rows) as dataframes
+    """
+    return expand_ledger_plan(plan_ledger(df), as_of)
+
+def plan_ledger(df):
+    """
+    Runs the grouped engine up to, but not including, the monthly Subscribed Billing expansion.
+    
+    The plan holds the emitted ledger rows and the billing intervals to expand into them. Open-ended
+    intervals are only resolved against the as-of date in expand_ledger_plan, so a plan stays
+    valid from one month to the next.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe (or a subset of whole accounts)
+        
+    Returns:
+        dict: 'rows' (emitted ledger rows), 'intervals' and 'multiple_subscription_intervals'
+              (interval tables from billing_interval_table)
+    """
+    # Identify duplicate records (boolean mask indexed by row position)
+    with timed_stage(None, 'duplicate_detection', rows_in=len(df)) as stage:
+        duplicate_mask = mark_duplicates(df)
+        stage['rows_out'] = int(duplicate_mask.sum())
+    
+    with timed_stage(None, 'single_entry_accounts', rows_in=len(df)) as stage:
+        single_entry_active_accounts = find_single_entry_active_accounts(df)
+        stage['rows_out'] = len(single_entry_active_accounts)
+    
+    # Accounts with multiple Add Products entries for the same product code
+    # with no Reduction or Debook entries between them
+    with timed_stage(None, 'identify_multiple_subscriptions', rows_in=len(df)) as stage:
+        accounts_with_multiple_subscriptions = identify_multiple_subscriptions(df)
+        stage['rows_out'] = len(accounts_with_multiple_subscriptions)
+    
+    with timed_stage(None, 'row_loop', rows_in=len(df)) as stage:
+        ledger, billing_intervals, template_index = process_rows_grouped(
+            df, duplicate_mask, single_entry_active_accounts, accounts_with_multiple_subscriptions)
+        stage['rows_out'] = ledger_size(ledger)
+    
+    # Subscribed Billing for accounts with multiple subscriptions runs up to the current month
+    with timed_stage(None, 'multiple_subscription_post_pass', rows_in=ledger_size(ledger)) as stage:
+        multiple_subscription_intervals = []
+        schedule_multiple_subscription_billing(ledger, multiple_subscription_intervals,
+                                               accounts_with_multiple_subscriptions, template_index)
+        stage['rows_out'] = len(multiple_subscription_intervals)
+    
+    emitted = ledger_frame(ledger)
+    
+    return {
+        'rows': emitted,
+        'intervals': billing_interval_table(emitted, billing_intervals),
+        'multiple_subscription_intervals': billing_interval_table(emitted, multiple_subscription_intervals),
+    }
+
+def expand_ledger_plan(plan, as_of=None):
+    """
+    Expands every billing interval of a ledger plan into monthly rows in one pass.
+    
+    Args:
+        plan (dict): Ledger plan from plan_ledger
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
+        
+    Returns:
+        tuple: (account rows, multiple-subscription rows) as dataframes
+    """
+    emitted = plan['rows']
+    with timed_stage(None, 'billing_expansion', rows_in=len(emitted)) as stage:
+        account_rows = assemble_ledger(emitted, plan['intervals'], as_of)
+        multiple_subscription_rows = expand_monthly_billing(plan['multiple_subscription_intervals'],
+                                                            as_of)[emitted.columns]
+        stage['rows_out'] = len(account_rows) + len(multiple_subscription_rows)
+    
+    return account_rows, multiple_subscription_rows
+
+def combine_ledger_parts(parts):
+    """
+    Concatenates ledger parts in order, skipping empty ones so they don't change column dtypes.
+    """
+    non_empty = [part for part in parts if len(part)]
+    if not non_empty:
+        return parts[0]
+    if len(non_empty) == 1:
+        return non_empty[0].reset_index(drop=True)
+    return pd.concat(non_empty, ignore_index=True)
+
+def build_ledger_sharded(df, shards, max_workers=None, as_of=None):
+    """
+    Builds the ledger with the grouped engine on account shards in worker processes.
+    
+    Accounts are assigned to shards by a hash of the Account Name, so an account's rows are never
+    split. Each shard's rows are merged back by the position of their account in the sorted frame,
+    which reproduces the serial ledger exactly.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe with empty Note fields
+        shards (int): Number of account shards
+        max_workers (int, optional): Number of worker processes (defaults to the CPU count)
+        as_of (date, optional): Last billing date (defaults to today)
+        
+    Returns:
+        pd.DataFrame: The ledger in output order
+    """
+    accounts = df['Account Name']
+    
+    # Position of each account's first row; rows without an account stand alone
+    new_account = ~accounts.eq(accounts.shift(1)).to_numpy(dtype=bool)
+    positions = np.arange(len(df))
+    account_order = np.maximum.accumulate(np.where(new_account, positions, 0))
+    
+    # Stable hash so the assignment doesn't depend on the process
+    shard_ids = pd.util.hash_pandas_object(accounts, index=False).to_numpy() % shards
+    
+    sharded = df.assign(_account_order=account_order)
+    shard_frames = [sharded[shard_ids == shard].reset_index(drop=True) for shard in range(shards)]
+    shard_frames = [frame for frame in shard_frames if len(frame)]
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        shard_parts = list(executor.map(build_ledger_parts, shard_frames, [resolve_as_of(as_of)] * len(shard_frames)))
+    
+    # Merge each part across shards by account position; the sort is stable, so rows keep
+    # their order within an account
+    merged_parts = []
+    for part_index in range(2):
+        parts = [parts[part_index] for parts in shard_parts if len(parts[part_index])]
+        if not parts:
+            merged_parts.append(shard_parts[0][part_index])
+            continue
+        part = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        part = part.sort_values(by='_account_order', kind='stable')
+        merged_parts.append(part)
+    
+    return combine_ledger_parts(merged_parts).drop(columns=['_account_order'])
+
+def build_ledger_incremental(df, state_path, as_of=None):
+    """
+    Builds the ledger by recomputing only the accounts that changed since the previous run.
+    
+    Each (Account Name, Product Code) group is fingerprinted. Accounts whose fingerprints are
+    unchanged reuse the ledger plan saved by the previous run, the rest go through the grouped
+    engine, and the merged plan is expanded up to the as-of date, so the new month's
+    Subscribed Billing rows are added for every account. The output is identical to a full run.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe with empty Note fields
+        state_path (str): Path of the state file read and rewritten by incremental runs
+        as_of (date, optional): Last billing date (defaults to today)
+        
+    Returns:
+        pd.DataFrame: The ledger in output order
+    """
+    if not len(df):
+        return build_ledger(df, as_of=as_of)
+    
+    accounts = df['Account Name']
+    fingerprints = account_fingerprints(df)
+    dtypes = df.dtypes.astype(str).to_dict()
+    
+    # A saved plan is only usable if the export was read with the same column types
+    state = load_ledger_state(state_path)
+    if state is not None and state['dtypes'] != dtypes:
+        state = None
+    previous_fingerprints = state['fingerprints'] if state is not None else {}
+    
+    # Suffixed subscription names can point at another account's rows, so an account is
+    # recomputed together with every account sharing its base name
+    changed_accounts = {key[0] for key in fingerprints.keys() | previous_fingerprints.keys()
+                        if fingerprints.get(key) != previous_fingerprints.get(key)}
+    changed_families = {account_family(account_name) for account_name in changed_accounts
+                        if not pd.isna(account_name)}
+    families = accounts.map(account_family, na_action='ignore')
+    changed = (accounts.isna() | families.isin(changed_families)).to_numpy()
+    
+    # Position of each account's first row; rows without an account stand alone
+    new_account = ~accounts.eq(accounts.shift(1)).to_numpy(dtype=bool)
+    positions = np.arange(len(df))
+    first_rows = new_account & accounts.notna().to_numpy()
+    account_order = dict(zip(accounts[first_rows], positions[first_rows]))
+    tracked = df.assign(_account=accounts,
+                        _account_order=np.maximum.accumulate(np.where(new_account, positions, 0)))
+    
+    plans = []
+    if state is not None:
+        reused_accounts = set(accounts[~changed].dropna())
+        plans.append({name: frame[frame['_account'].isin(reused_accounts)].reset_index(drop=True)
+                      for name, frame in state['plan'].items()})
+    if changed.any():
+        plans.append(localize_ledger_plan(plan_ledger(tracked[changed].reset_index(drop=True))))
+    
+    plan = splice_ledger_plans(plans, account_order)
+    
+    pd.to_pickle({'version': ledger_engine_version(), 'dtypes': dtypes, 'fingerprints': fingerprints,
+                  'plan': plan}, state_path)
+    
+    num_accounts = accounts.nunique(dropna=False)
+    num_changed = accounts[changed].nunique(dropna=False)
+    print(f"Incremental run: recomputed {num_changed} of {num_accounts} accounts.")
+    
+    account_rows, multiple_subscription_rows = expand_ledger_plan(globalize_ledger_plan(plan), as_of)
+    
+    return combine_ledger_parts([account_rows, multiple_subscription_rows]).drop(
+        columns=['_account', '_account_order'])
+
+def account_fingerprints(df):
+    """
+    Fingerprints every (Account Name, Product Code) group of the sorted opportunities, so a later
+    run can tell which accounts changed between exports.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe
+        
+    Returns:
+        dict: Hex digest of the group's rows by (Account Name, Product Code)
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    accounts = df['Account Name'].tolist()
+    product_codes = df['Product Code'].tolist()
+    
+    fingerprints = {}
+    for start, end in split_account_groups(df):
+        digest = hashlib.sha1(row_hashes[start:end].tobytes()).hexdigest()
+        fingerprints[(accounts[start], product_codes[start])] = digest
+    
+    return fingerprints
+
+def ledger_engine_version():
+    """
+    Returns a hash of this script, so cached ledger plans are dropped whenever the rules change.
+    """
+    with open(os.path.abspath(__file__), 'rb') as script:
+        return hashlib.sha1(script.read()).hexdigest()
+
+def load_ledger_state(state_path):
+    """
+    Loads the fingerprints and ledger plan saved by the previous incremental run.
+    
+    Args:
+        state_path (str): Path of the state file
+        
+    Returns:
+        dict: The saved state, or None if there is none or it was written by another version
+    """
+    if not os.path.exists(state_path):
+        return None
+    
+    try:
+        state = pd.read_pickle(state_path)
+    except Exception as e:
+        print(f"Could not read ledger state {os.path.basename(state_path)}: {e}")
+        return None
+    
+    if state.get('version') != ledger_engine_version():
+        return None
+    
+    return state
+
+def file_content_hash(file_path):
+    """
+    Returns the SHA-256 hex digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def ledger_cache_path(cache_dir, content_hash, as_of):
+    """
+    Returns the cache file of an export's expanded ledger, keyed by (content hash, as-of month).
+    """
+    return os.path.join(cache_dir, f"{content_hash}_{as_of:%Y-%m}.pkl")
+
+def billing_window(dates, as_of):
+    """
+    Returns the days of the as-of month over which a ledger expanded as of as_of stays the same.
+    
+    Open-ended subscriptions bill on the day of the month of their previous row (clamped to the
+    length of the month), so the ledger can only change on a day of the month that already occurs
+    in it. Between two such days, every as-of date gives the same rows.
+    
+    Args:
+        dates (pd.Series): The ledger Dates
+        as_of (date): The as-of date the ledger was expanded for
+        
+    Returns:
+        tuple: (first day, day after the last day) of the as-of month with the same ledger
+    """
+    days_in_month = calendar.monthrange(as_of.year, as_of.month)[1]
+    billing_days = np.minimum(dates.dropna().dt.day.unique(), days_in_month)
+    
+    earlier = billing_days[billing_days <= as_of.day]
+    later = billing_days[billing_days > as_of.day]
+    first_day = int(earlier.max()) if len(earlier) else 1
+    end_day = int(later.min()) if len(later) else days_in_month + 1
+    
+    return first_day, end_day
+
+def load_cached_ledger(cache_path, as_of):
+    """
+    Loads an export's expanded ledger from the cache.
+    
+    The cached ledger is used as is when the as-of date bills the same rows (see billing_window).
+    Otherwise the cached ledger plan, if there is one, is expanded up to the new as-of date and
+    the cache is updated, so only the monthly expansion is redone.
+    
+    Args:
+        cache_path (str): Cache file from ledger_cache_path
+        as_of (date): The as-of date of this run
+        
+    Returns:
+        tuple: (the ledger with the special entries, dtype of the Amount column as read, number of
+               rows of the export), or None if there is no usable cache entry for this version of the script
+    """
+    if not os.path.exists(cache_path):
+        return None
+    
+    try:
+        cached = pd.read_pickle(cache_path)
+    except Exception:
+        return None
+    
+    if cached['version'] != ledger_engine_version():
+        return None
+    
+    first_day, end_day = cached['window']
+    if first_day <= as_of.day < end_day:
+        return cached['ledger'], cached['amount_dtype'], cached['source_rows']
+    
+    if cached['plan'] is None:
+        return None
+    
+    result_df = combine_ledger_parts(expand_ledger_plan(cached['plan'], as_of))
+    result_df = add_special_intermediate_entries(result_df)
+    store_cached_ledger(cache_path, result_df, cached['amount_dtype'], cached['source_rows'], as_of, cached['plan'])
+    
+    return result_df, cached['amount_dtype'], cached['source_rows']
+
+def store_cached_ledger(cache_path, result_df, amount_dtype, source_rows, as_of, plan=None):
+    """
+    Saves an export's expanded ledger (with the special entries) to the cache.
+    
+    Args:
+        cache_path (str): Cache file from ledger_cache_path
+        result_df (pd.DataFrame): The ledger
+        amount_dtype (numpy.dtype): dtype of the Amount column as read
+        source_rows (int): Number of rows of the export
+        as_of (date): The as-of date the ledger was expanded for
+        plan (dict, optional): The ledger plan from plan_ledger, to re-expand for other as-of dates
+    """
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    
+    pd.to_pickle({'version': ledger_engine_version(), 'window': billing_window(result_df['Date'], as_of),
+                  'ledger': result_df, 'amount_dtype': amount_dtype, 'source_rows': source_rows, 'plan': plan},
+                 cache_path)
+
+def account_family(account_name):
+    """
+    Returns the base name shared by an account and its suffixed subscriptions (e.g. Name_2 -> Name).
+    """
+    return subscription_number(account_name)[0]
+
+def subscription_number(account_name):
+    """
+    Splits a ledger account name into its base account name and subscription number
+    (e.g. Name_2 -> (Name, 2); the first subscription has no suffix, Name -> (Name, 1)).
+    """
+    base_name, _, suffix = str(account_name).rpartition('_')
+    if base_name and suffix.isdigit():
+        return base_name, int(suffix)
+    return account_name, 1
+
+def group_subscriptions(account_names):
+    """
+    Groups ledger account names by base account, keeping only the base accounts with more than
+    one subscription among them.
+    
+    Args:
+        account_names (iterable): Ledger account names, e.g. Name, Name_2, Name_3
+        
+    Returns:
+        dict: Base account name -> list of its ledger account names
+    """
+    subscriptions = {}
+    has_numbered_subscription = set()
+    for account_name in account_names:
+        base_name, number = subscription_number(account_name)
+        subscriptions.setdefault(base_name, []).append(account_name)
+        if number > 1:
+            has_numbered_subscription.add(base_name)
+    
+    return {base_name: subscriptions[base_name] for base_name in has_numbered_subscription}
+
+def account_row_starts(rows):
+    """
+    Returns the index of the first row of each account in a ledger plan, by '_account_order'.
+    """
+    first_rows = ~rows['_account_order'].duplicated().to_numpy()
+    return pd.Series(np.flatnonzero(first_rows), index=rows['_account_order'][first_rows].to_numpy())
+
+def localize_ledger_plan(plan):
+    """
+    Makes the interval positions of a ledger plan relative to the first row of their account,
+    so accounts can be moved between plans.
+    """
+    intervals = plan['intervals'].copy()
+    intervals['_position'] -= intervals['_account_order'].map(account_row_starts(plan['rows'])).to_numpy()
+    
+    return dict(plan, intervals=intervals)
+
+def globalize_ledger_plan(plan):
+    """
+    Turns the account-relative interval positions of a ledger plan back into row positions.
+    """
+    intervals = plan['intervals'].copy()
+    intervals['_position'] += intervals['_account_order'].map(account_row_starts(plan['rows'])).to_numpy()
+    
+    return dict(plan, intervals=intervals)
+
+def splice_ledger_plans(plans, account_order):
+    """
+    Merges localized ledger plans of disjoint account sets into the plan of a full run.
+    
+    Rows and intervals are reordered by the position of their account in the sorted frame; the
+    sorts are stable, so every account keeps its own order.
+    
+    Args:
+        plans (list): Ledger plans from localize_ledger_plan, with '_account' and '_account_order' columns
+        account_order (dict): Position of each account's first row in the sorted frame
+        
+    Returns:
+        dict: The merged ledger plan (positions still account-relative)
+    """
+    merged = {}
+    for name in ['rows', 'intervals', 'multiple_subscription_intervals']:
+        frames = []
+        for plan in plans:
+            frame = plan[name]
+            
+            # Rows without an account are always recomputed and keep their position from this run
+            frame = frame.assign(_account_order=frame['_account'].map(account_order)
+                                 .fillna(frame['_account_order']).astype('int64'))
+            frames.append(frame)
+        
+        frame = combine_ledger_parts(frames).sort_values(by='_account_order', kind='stable')
+        merged[name] = frame.reset_index(drop=True)
+    
+    merged['intervals']['_interval'] = np.arange(len(merged['intervals']))
+    
+    return merged
+
+def process_rows_grouped(df, duplicate_mask, single_entry_active_accounts, accounts_with_multiple_subscriptions):
+    """
+    Builds the ledger rows by splitting the sorted frame into (Account Name, Product Code)
+    groups once and running each subscription lifecycle as a linear pass over its group.
+    Produces the same rows and Notes as the row-by-row engine of Quick_Assist_Ledger_V4_reference.py.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe with empty Note fields
+        duplicate_mask (numpy.ndarray): Boolean duplicate flags from mark_duplicates
+        single_entry_active_accounts (set): (Account Name, Product Code) pairs with a single active entry
+        accounts_with_multiple_subscriptions (dict): Output of identify_multiple_subscriptions
+        
+    Returns:
+        tuple: (ledger columns from new_ledger in output order, Subscribed Billing intervals,
+                template index from index_ledger_rows)
+    """
+    ledger = new_ledger(df.columns)
+    billing_intervals = []
+    template_index = {}
+    
+    # Pull every column into a plain list once instead of an iloc per lookup
+    source = {col: df[col].tolist() for col in df.columns}
+    
+    # Missing amounts become NaN, so every comparison with them is False
+    source['Amount'] = df['Amount'].astype('float64').tolist()
+    
+    # Subscription number for each start date of a multi-subscription account (first match wins)
+    subscription_numbers = {}
+    for account_name, subscriptions in accounts_with_multiple_subscriptions.items():
+        numbers = {}
+        for sub_num, sub_info in enumerate(subscriptions, 1):
+            if not pd.isna(sub_info['date']):
+                numbers.setdefault(sub_info['date'], sub_num)
+        subscription_numbers[account_name] = numbers
+    
+    for start, end in split_account_groups(df):
+        product_code = source['Product Code'][start]
+        group_first_row = ledger_size(ledger)
+        
+        if product_code == '350-0100':
+            process_subscription_group(source, start, end, duplicate_mask, single_entry_active_accounts,
+                                       subscription_numbers, ledger, billing_intervals)
+            index_ledger_rows(template_index, ledger, group_first_row)
+            continue
+        
+        # On Demand and other product codes only need a note per row
+        for pos in range(start, end):
+            if duplicate_mask[pos]:
+                append_source_row(ledger, source, pos, {'Amount': None, **note_fields(NOTE_DUPLICATE)})
+            elif product_code == '350-0101' and source['Opportunity Type'][pos] == 'Add Products':
+                append_source_row(ledger, source, pos, note_fields(NOTE_ON_DEMAND_ENTRY))
+            elif product_code == '350-0101' and source['Opportunity Type'][pos] in ['Reduction', 'Debook']:
+                append_source_row(ledger, source, pos, note_fields(NOTE_REDUCTION))
+            else:
+                append_source_row(ledger, source, pos)
+        index_ledger_rows(template_index, ledger, group_first_row)
+    
+    return ledger, billing_intervals, template_index
+
+def process_subscription_group(source, start, end, duplicate_mask, single_entry_active_accounts,
+                               subscription_numbers, ledger, billing_intervals):
+    """
+    Runs the add -> partial reduction -> end lifecycle for one 350-0100 account group.
+    
+    Args:
+        source (dict): Column name -> list of values of the sorted Closed Won dataframe
+        start (int): Position of the first row of the group
+        end (int): Position after the last row of the group
+        duplicate_mask (numpy.ndarray): Boolean duplicate flags from mark_duplicates
+        single_entry_active_accounts (set): (Account Name, Product Code) pairs with a single active entry
+        subscription_numbers (dict): Account name -> {start date: subscription number}
+        ledger (dict): Ledger columns from new_ledger, appended to in output order
+        billing_intervals (list): Subscribed Billing intervals, appended to (see billing_interval)
+    """
+    opp_types = source['Opportunity Type']
+    amounts = source['Amount']
+    
+    # Backward sweep: for each row, the next Reduction/Debook in the group and the last
+    # negative Add Products before it, skipping duplicates
+    next_reduction = [-1] * (end - start)
+    last_partial = [-1] * (end - start)
+    reduction_index = -1
+    partial_reduction_index = -1
+    for pos in range(end - 1, start - 1, -1):
+        next_reduction[pos - start] = reduction_index
+        last_partial[pos - start] = partial_reduction_index
+        if duplicate_mask[pos]:
+            continue
+        if opp_types[pos] in ['Reduction', 'Debook']:
+            reduction_index = pos
+            partial_reduction_index = -1
+        elif opp_types[pos] == 'Add Products' and amounts[pos] < 0 and partial_reduction_index == -1:
+            partial_reduction_index = pos
     
-    # First, identify accounts with multiple "Start of Subscription" entries
-    # This function finds accounts with multiple Add Products entries for the same product code
-    # with no Reduction or Debook entries between them
-    accounts_with_multiple_subscriptions = identify_multiple_subscriptions(df)
+    # Forward sweep: whether an earlier row started a subscription, and the amount of the
+    # latest earlier Add Products row (wrapped in a tuple so a missing amount still counts)
+    prior_positive_add = [False] * (end - start)
+    prior_add_amount = [None] * (end - start)
+    seen_positive_add = False
+    latest_add_amount = None
+    for pos in range(start, end):
+        prior_positive_add[pos - start] = seen_positive_add
+        prior_add_amount[pos - start] = latest_add_amount
+        if opp_types[pos] == 'Add Products':
+            latest_add_amount = (amounts[pos],)
+            if amounts[pos] > 0:
+                seen_positive_add = True
     
-    # Process each row
-    i = 0
-    while i < len(df):
-        current_row = df.iloc[i].copy()
+    i = start
+    while i < end:
+        opportunity_type = opp_types[i]
+        amount = amounts[i]
         
         # Handle duplicates
-        if i in duplicate_indices:
-            current_row['Amount'] = None
-            current_row['Note'] = "Duplicate"
-            result_df.append(current_row)
+        if duplicate_mask[i]:
+            append_source_row(ledger, source, i, {'Amount': None, **note_fields(NOTE_DUPLICATE)})
             i += 1
             continue
         
-        # Special case handling for Copart, Inc - directly in row processing
-        if current_row['Account Name'] == 'Copart, Inc' and current_row['Product Code'] == '350-0100':
-            # For the second Add Products entry which is $0, mark it as a swap
-            if current_row['Amount'] == 0 and current_row['Opportunity Type'] == 'Add Products':
-                current_row['Note'] = "Start of Subscription - Swap"
-            # For the first entry with $200, keep as Start of Subscription
-            elif current_row['Amount'] > 0 and current_row['Opportunity Type'] == 'Add Products':
-                current_row['Note'] = "Start of Subscription"
+        account_name = source['Account Name'][i]
+        note = source['Note Code'][i]
+        suffix = source['Note Suffix'][i]
+        
+        # Special case handling for Copart, Inc
+        if account_name == 'Copart, Inc':
+            if amount == 0 and opportunity_type == 'Add Products':
+                note, suffix = NOTE_START_OF_SUBSCRIPTION, SWAP_SUFFIX
+            elif amount > 0 and opportunity_type == 'Add Products':
+                note, suffix = NOTE_START_OF_SUBSCRIPTION, ""
+        
+        # New subscriptions
+        if opportunity_type == 'Add Products' and amount > 0:
+            row_account_name = account_name
+            if account_name in subscription_numbers:
+                sub_num = subscription_numbers[account_name].get(source['Date'][i])
+                if sub_num is not None:
+                    note, suffix = NOTE_START_OF_SUBSCRIPTION, ""
+                    if sub_num > 1:
+                        row_account_name = f"{account_name}_{sub_num}"
+            else:
+                note, suffix = NOTE_START_OF_SUBSCRIPTION, ""
             
-        # Process 350-0100 product code (Service Optimization)
-        if current_row['Product Code'] == '350-0100':
-            # Handle Add Products entries with positive amounts (new subscriptions)
-            if current_row['Opportunity Type'] == 'Add Products' and current_row['Amount'] > 0:
-                account_name = current_row['Account Name']
-                
-                # Check if this account has multiple subscriptions and handle accordingly
-                if account_name in accounts_with_multiple_subscriptions:
-                    subscriptions = accounts_with_multiple_subscriptions[account_name]
-                    # Find which subscription number this is based on date
-                    for sub_num, sub_info in enumerate(subscriptions, 1):
-                        if sub_info['date'] == current_row['Date']:
-                            # Set the Note as "Start of Subscription" for all instances
-                            current_row['Note'] = "Start of Subscription"
-                            
-                            # For subsequent subscriptions, modify the Account_Name field
-                            if sub_num > 1:
-                                # Add suffix to Account_Name for subscriptions after the first
-                                current_row['Account Name'] = f"{account_name}_{sub_num}"
-                            break
-                else:
-                    # Normal case - only one subscription
-                    current_row['Note'] = "Start of Subscription"
-                
-                # Check for a subsequent reduction/debook for the same account and product
+            # Suffixed subscriptions never match later rows of the original account name
+            if row_account_name == account_name:
+                reduction_index = next_reduction[i - start]
+                partial_reduction_index = last_partial[i - start]
+            else:
                 reduction_index = -1
                 partial_reduction_index = -1
-                
-                for j in range(i + 1, len(df)):
-                    next_row = df.iloc[j]
-                    # Skip if this is a marked duplicate
-                    if j in duplicate_indices:
-                        continue
-                        
-                    if next_row['Account Name'] == current_row['Account Name'] and next_row['Product Code'] == current_row['Product Code']:
-                        # Check for Reduction/Debook opportunity types
-                        if next_row['Opportunity Type'] in ['Reduction', 'Debook']:
-                            reduction_index = j
-                            break
-                        # Check for Add Products with negative amount (partial reduction)
-                        elif next_row['Opportunity Type'] == 'Add Products' and next_row['Amount'] < 0:
-                            partial_reduction_index = j
-                            
-                    elif next_row['Account Name'] != current_row['Account Name']:
-                        # We've moved to a different account, stop looking
-                        break
-                
-                result_df.append(current_row)
-                
-                # For accounts with multiple subscriptions, we need to handle them specially
-                if account_name in accounts_with_multiple_subscriptions and current_row['Account Status'] == 'Active':
-                    # We'll handle intermediate entries for these in a separate section
-                    # to avoid duplicate processing
-                    pass
-                
-                # Check if this is a single-entry active account that needs to be extended to current month
-                # Also include United Mortgage Lending which is a special case
-                if current_row['Account Name'] == 'United Mortgage Lending' and current_row['Account Status'] == 'Active':
-                    # Always ensure United Mortgage Lending gets the Start of Subscription note
-                    current_row['Note'] = 'Start of Subscription'
-                
-                if (((current_row['Account Name'], current_row['Product Code']) in single_entry_active_accounts and
-                     current_row['Account Status'] == 'Active') or 
-                    (current_row['Account Name'] == 'United Mortgage Lending' and 
-                     current_row['Account Status'] == 'Active')):
-                    
-                    # Calculate entries from subscription date to current month
-                    current_date = current_row['Date']
-                    current_month = datetime.now()
-                    
-                    # Generate intermediate monthly entries
-                    next_date = current_date + relativedelta(months=1)
-                    while next_date < current_month:
-                        # Create new intermediate row
-                        intermediate_row = current_row.copy()
-                        intermediate_row['Date'] = next_date
-                        
-                        # Use the same Note suffix for intermediate entries
-                        if "Start of Subscription" in current_row['Note']:
-                            suffix = current_row['Note'].replace("Start of Subscription", "").strip()
-                            if suffix:
-                                intermediate_row['Note'] = f"Subscribed Billing {suffix}"
-                            else:
-                                intermediate_row['Note'] = "Subscribed Billing"
-                        else:
-                            intermediate_row['Note'] = "Subscribed Billing"
-                            
-                        result_df.append(intermediate_row)
-                        
-                        # Move to the next month
-                        next_date = next_date + relativedelta(months=1)
-                
-                # Handle partial reduction case (Example C - Add Products with negative amount)
-                if partial_reduction_index != -1:
-                    partial_row = df.iloc[partial_reduction_index].copy()
-                    
-                    # Keep the same numbering for reductions if present
-                    if "Start of Subscription" in current_row['Note']:
-                        suffix = current_row['Note'].replace("Start of Subscription", "").strip()
-                        if suffix:
-                            partial_row['Note'] = f"Reduction - Subscribed Billing {suffix}"
-                        else:
-                            partial_row['Note'] = "Reduction - Subscribed Billing"
-                    else:
-                        partial_row['Note'] = "Reduction - Subscribed Billing"
-                        
-                    result_df.append(partial_row)
-                    
-                    # Skip processing this partial reduction row again
-                    i = partial_reduction_index + 1
-                    continue
-                
-                # If we found a reduction/debook entry
-                elif reduction_index != -1:
-                    reduction_row = df.iloc[reduction_index].copy()
-                    current_date = current_row['Date']
-                    reduction_date = reduction_row['Date']
-                    
-                    # Check if there are missing months between add and reduction
-                    if current_date != reduction_date:
-                        # Generate intermediate monthly entries
-                        next_date = current_date + relativedelta(months=1)
-                        while next_date < reduction_date:
-                            # Create new intermediate row
-                            intermediate_row = current_row.copy()
-                            intermediate_row['Date'] = next_date
-                            
-                            # Use the same Note suffix for intermediate entries
-                            if "Start of Subscription" in current_row['Note']:
-                                suffix = current_row['Note'].replace("Start of Subscription", "").strip()
-                                if suffix:
-                                    intermediate_row['Note'] = f"Subscribed Billing {suffix}"
-                                else:
-                                    intermediate_row['Note'] = "Subscribed Billing"
-                            else:
-                                intermediate_row['Note'] = "Subscribed Billing"
-                            
-                            # Check if there was a partial reduction before this and adjust amount
-                            if partial_reduction_index != -1:
-                                partial_row = df.iloc[partial_reduction_index]
-                                if partial_row['Date'] < next_date:
-                                    # Adjust the amount based on the partial reduction
-                                    intermediate_row['Amount'] = float(current_row['Amount']) + float(partial_row['Amount'])
-                                    
-                            result_df.append(intermediate_row)
-                            
-                            # Move to the next month
-                            next_date = next_date + relativedelta(months=1)
-                    
-                    # Add the reduction row with appropriate note
-                    # Keep the same numbering for reductions if present
-                    if "Start of Subscription" in current_row['Note']:
-                        suffix = current_row['Note'].replace("Start of Subscription", "").strip()
-                        if suffix:
-                            reduction_row['Note'] = f"Reduction - End of Subscription {suffix}"
-                        else:
-                            reduction_row['Note'] = "Reduction - End of Subscription"
-                    else:
-                        reduction_row['Note'] = "Reduction - End of Subscription"
-                        
-                    result_df.append(reduction_row)
-                    
-                    # Skip processing this reduction row again
-                    i = reduction_index + 1
-                    continue
             
-            # Handle "Add Products" with negative amounts (partial reductions) that weren't handled in the previous section
-            elif current_row['Opportunity Type'] == 'Add Products' and current_row['Amount'] < 0:
-                # Check if there was a previous Add Products entry with positive amount
-                add_product_index = -1
-                for j in range(i - 1, -1, -1):
-                    prev_row = df.iloc[j]
-                    if (prev_row['Account Name'] == current_row['Account Name'] and 
-                        prev_row['Product Code'] == current_row['Product Code'] and
-                        prev_row['Opportunity Type'] == 'Add Products' and
-                        prev_row['Amount'] > 0):
-                        add_product_index = j
-                        break
-                    elif prev_row['Account Name'] != current_row['Account Name']:
-                        # We've moved to a different account, stop looking
-                        break
-                
-                if add_product_index != -1:
-                    # Get the original subscription note to maintain the same numbering
-                    original_note = df.iloc[add_product_index]['Note'] if 'Note' in df.iloc[add_product_index] and df.iloc[add_product_index]['Note'] else ""
-                    
-                    # This is a partial reduction
-                    if "Start of Subscription" in original_note:
-                        suffix = original_note.replace("Start of Subscription", "").strip()
-                        if suffix:
-                            current_row['Note'] = f"Reduction - Subscribed Billing {suffix}"
-                        else:
-                            current_row['Note'] = "Reduction - Subscribed Billing"
-                    else:
-                        current_row['Note'] = "Reduction - Subscribed Billing"
-                else:
-                    # Unexpected case, just add a general note
-                    current_row['Note'] = "Reduction"
-                
-                result_df.append(current_row)
-                
-            # Handle Reduction entries 
-            elif current_row['Opportunity Type'] == 'Reduction' and current_row['Amount'] < 0:
-                # Check if there was a previous Add Products entry
-                add_product_index = -1
-                for j in range(i - 1, -1, -1):
-                    prev_row = df.iloc[j]
-                    if (prev_row['Account Name'] == current_row['Account Name'] and 
-                        prev_row['Product Code'] == current_row['Product Code'] and
-                        prev_row['Opportunity Type'] == 'Add Products'):
-                        add_product_index = j
-                        break
-                    elif prev_row['Account Name'] != current_row['Account Name']:
-                        # We've moved to a different account, stop looking
-                        break
-                
-                if add_product_index != -1:
-                    # Get the original subscription note to maintain the same numbering
-                    original_note = df.iloc[add_product_index]['Note'] if 'Note' in df.iloc[add_product_index] and df.iloc[add_product_index]['Note'] else ""
-                    
-                    if abs(df.iloc[add_product_index]['Amount']) > abs(current_row['Amount']):
-                        # This is a partial reduction
-                        if "Start of Subscription" in original_note:
-                            suffix = original_note.replace("Start of Subscription", "").strip()
-                            if suffix:
-                                current_row['Note'] = f"Reduction - Subscribed Billing {suffix}"
-                            else:
-                                current_row['Note'] = "Reduction - Subscribed Billing"
-                        else:
-                            current_row['Note'] = "Reduction - Subscribed Billing"
-                    else:
-                        # Standard reduction ending subscription
-                        if "Start of Subscription" in original_note:
-                            suffix = original_note.replace("Start of Subscription", "").strip()
-                            if suffix:
-                                current_row['Note'] = f"Reduction - End of Subscription {suffix}"
-                            else:
-                                current_row['Note'] = "Reduction - End of Subscription"
-                        else:
-                            current_row['Note'] = "Reduction - End of Subscription"
-                else:
-                    # No matching Add Products entry found
-                    current_row['Note'] = "Reduction - End of Subscription"
-                
-                result_df.append(current_row)
+            is_active = source['Account Status'][i] == 'Active'
+            if row_account_name == 'United Mortgage Lending' and is_active:
+                note, suffix = NOTE_START_OF_SUBSCRIPTION, ""
             
-            # Handle Debook opportunity type
-            elif current_row['Opportunity Type'] == 'Debook':
-                # Check if there was a previous Add Products entry to get the numbering
-                add_product_index = -1
-                for j in range(i - 1, -1, -1):
-                    prev_row = df.iloc[j]
-                    if (prev_row['Account Name'] == current_row['Account Name'] and 
-                        prev_row['Product Code'] == current_row['Product Code'] and
-                        prev_row['Opportunity Type'] == 'Add Products'):
-                        add_product_index = j
-                        break
-                    elif prev_row['Account Name'] != current_row['Account Name']:
-                        # We've moved to a different account, stop looking
-                        break
-                
-                if add_product_index != -1:
-                    # Get the original subscription note to maintain the same numbering
-                    original_note = df.iloc[add_product_index]['Note'] if 'Note' in df.iloc[add_product_index] and df.iloc[add_product_index]['Note'] else ""
-                    
-                    if "Start of Subscription" in original_note:
-                        suffix = original_note.replace("Start of Subscription", "").strip()
-                        if suffix:
-                            current_row['Note'] = f"Reduction - End of Subscription {suffix}"
-                        else:
-                            current_row['Note'] = "Reduction - End of Subscription"
-                    else:
-                        current_row['Note'] = "Reduction - End of Subscription"
-                else:
-                    current_row['Note'] = "Reduction - End of Subscription"
-                    
-                result_df.append(current_row)
+            start_row = append_source_row(ledger, source, i, {'Account Name': row_account_name,
+                                                              **note_fields(note, suffix)})
+            
+            # Rows that follow a start of subscription carry its suffix
+            if note != NOTE_START_OF_SUBSCRIPTION:
+                suffix = ""
+            
+            # Single-entry active accounts (and United Mortgage Lending) bill up to the current month
+            if (((row_account_name, source['Product Code'][i]) in single_entry_active_accounts and is_active) or
+                    (row_account_name == 'United Mortgage Lending' and is_active)):
+                billing_intervals.append(billing_interval(ledger_size(ledger), start_row, None,
+                                                          NOTE_SUBSCRIBED_BILLING, suffix))
             
-            # Add other cases
+            # Partial reduction keeps the subscription running at the reduced amount
+            if partial_reduction_index != -1:
+                append_source_row(ledger, source, partial_reduction_index,
+                                  note_fields(NOTE_REDUCTION_SUBSCRIBED_BILLING, suffix))
+                i = partial_reduction_index + 1
+                continue
+            
+            # Reduction/Debook ends the subscription; bill every month in between
+            if reduction_index != -1:
+                billing_intervals.append(billing_interval(ledger_size(ledger), start_row,
+                                                          source['Date'][reduction_index],
+                                                          NOTE_SUBSCRIBED_BILLING, suffix))
+                append_source_row(ledger, source, reduction_index,
+                                  note_fields(NOTE_REDUCTION_END_OF_SUBSCRIPTION, suffix))
+                i = reduction_index + 1
+                continue
+            
+            i += 1
+            continue
+        
+        # Add Products with a negative amount that no subscription consumed
+        if opportunity_type == 'Add Products' and amount < 0:
+            if prior_positive_add[i - start]:
+                note, suffix = NOTE_REDUCTION_SUBSCRIBED_BILLING, ""
             else:
-                result_df.append(current_row)
-        
-        # Handle 350-0101 Product Code (On Demand)
-        elif current_row['Product Code'] == '350-0101':
-            if current_row['Opportunity Type'] == 'Add Products':
-                # Set note for On Demand entries
-                current_row['Note'] = "On Demand Entry"
-                result_df.append(current_row)
-            elif current_row['Opportunity Type'] in ['Reduction', 'Debook']:
-                current_row['Note'] = "Reduction"
-                result_df.append(current_row)
+                note, suffix = NOTE_REDUCTION, ""
+        
+        # Reductions are partial while the latest Add Products amount still exceeds them
+        elif opportunity_type == 'Reduction' and amount < 0:
+            latest_add = prior_add_amount[i - start]
+            if latest_add is not None and abs(latest_add[0]) > abs(amount):
+                note, suffix = NOTE_REDUCTION_SUBSCRIBED_BILLING, ""
             else:
-                # Other cases for 350-0101
-                result_df.append(current_row)
+                note, suffix = NOTE_REDUCTION_END_OF_SUBSCRIPTION, ""
         
-        # For other product codes, just add the row as is
-        else:
-            result_df.append(current_row)
-            
+        elif opportunity_type == 'Debook':
+            note, suffix = NOTE_REDUCTION_END_OF_SUBSCRIPTION, ""
+        
+        append_source_row(ledger, source, i, note_fields(note, suffix))
         i += 1
+
+def new_ledger(columns):
+    """
+    Creates an empty column-oriented ledger: one growable list per output column.
+    Rows are appended column by column and turned into a dataframe once with ledger_frame.
+    
+    Args:
+        columns (list): The ledger column names
+        
+    Returns:
+        dict: Column name -> list of values
+    """
+    return {col: [] for col in columns}
+
+def ledger_size(ledger):
+    """
+    Returns the number of rows in a ledger created by new_ledger.
+    """
+    return len(next(iter(ledger.values()), []))
+
+def append_source_row(ledger, source, pos, overrides=None):
+    """
+    Appends row `pos` of the column lists in `source` to the ledger.
+    
+    Args:
+        ledger (dict): Ledger columns from new_ledger
+        source (dict): Column name -> list of values
+        pos (int): Position of the row in `source`
+        overrides (dict, optional): Column values to use instead of the source values
+        
+    Returns:
+        int: Position of the appended ledger row
+    """
+    for col, values in ledger.items():
+        if overrides and col in overrides:
+            values.append(overrides[col])
+        else:
+            values.append(source[col][pos])
+    return len(values) - 1
+
+def append_ledger_row(ledger, row, overrides=None):
+    """
+    Appends a row given as a mapping of column name -> value to the ledger.
+    
+    Args:
+        ledger (dict): Ledger columns from new_ledger
+        row (dict or pd.Series): The row values
+        overrides (dict, optional): Column values to use instead of the row values
+        
+    Returns:
+        int: Position of the appended ledger row
+    """
+    for col, values in ledger.items():
+        if overrides and col in overrides:
+            values.append(overrides[col])
+        else:
+            values.append(row[col])
+    return len(values) - 1
+
+def ledger_frame(ledger):
+    """
+    Converts the ledger columns into a dataframe, with Amount as int64 cents.
+    """
+    frame = pd.DataFrame(ledger)
+    frame['Amount'] = pd.array(frame['Amount'], dtype='Int64')
+    
+    return frame
+
+def billing_interval(position, template_row, end_date, note, suffix=""):
+    """
+    Describes a run of monthly Subscribed Billing rows for expand_monthly_billing.
+    
+    Args:
+        position (int): Index of the ledger row the expanded rows are placed before
+        template_row (int): Ledger row copied into every month; its Date is the interval start
+        end_date (datetime): Exclusive upper bound for the billed dates, or None for intervals
+            that run up to the current month and are extended on every run
+        note (int): Note code for the expanded rows
+        suffix (str): Note suffix for the expanded rows
+        
+    Returns:
+        dict: The interval record
+    """
+    return {'position': position, 'template': template_row, 'end': end_date, 'note': note, 'suffix': suffix}
+
+def index_ledger_rows(template_index, ledger, first_row):
+    """
+    Adds the ledger rows from `first_row` onwards to the template index. The index maps
+    (Account Name, Date) to the first ledger row with those values; the emitted Account Name
+    already carries the subscription suffix (e.g. "Account_2").
+    
+    Args:
+        template_index (dict): (Account Name, Date) -> ledger row position, updated in place
+        ledger (dict): Ledger columns from new_ledger
+        first_row (int): Position of the first row not indexed yet
+    """
+    accounts = ledger['Account Name']
+    dates = ledger['Date']
+    for pos in range(first_row, len(accounts)):
+        # Missing dates never match a lookup
+        if not pd.isna(dates[pos]):
+            template_index.setdefault((accounts[pos], dates[pos]), pos)
+
+def schedule_multiple_subscription_billing(ledger, billing_intervals, accounts_with_multiple_subscriptions,
+                                           template_index):
+    """
+    Adds a Subscribed Billing interval up to the current month for every subscription of the
+    accounts with multiple subscriptions. The start row emitted for each subscription is the template.
     
-    # Process accounts with multiple subscriptions to add intermediate entries
+    Args:
+        ledger (dict): Ledger columns emitted by process_rows_grouped
+        billing_intervals (list): Subscribed Billing intervals, appended to
+        accounts_with_multiple_subscriptions (dict): Output of identify_multiple_subscriptions
+        template_index (dict): (Account Name, Date) -> first ledger row, from index_ledger_rows
+    """
     for account_name, subscriptions in accounts_with_multiple_subscriptions.items():
-        # Sort subscriptions by date
         subscriptions = sorted(subscriptions, key=lambda x: x['date'])
-        current_month = datetime.now()
         
-        # Iterate through each subscription separately and generate entries up to current month
         for sub_num, sub_info in enumerate(subscriptions, 1):
             current_date = sub_info['date']
-            current_amount = sub_info['amount']
-            
-            # For each subscription, generate entries from its start date to current month
-            intermediate_date = current_date + relativedelta(months=1)
             
-            # Find the existing row for this subscription to use as template
-            # For subscriptions after the first one, we need to look for Account_Name with suffix
+            # Subscriptions after the first one carry the account name suffix
             search_account_name = account_name
             if sub_num > 1:
                 search_account_name = f"{account_name}_{sub_num}"
-                
-            base_entries = [r for r in result_df if r['Account Name'] == search_account_name and r['Date'] == current_date]
             
-            if base_entries:
-                base_row = base_entries[0].copy()
-                
-                while intermediate_date < current_month:
-                    # Create new intermediate row
-                    intermediate_row = base_row.copy()
-                    intermediate_row['Date'] = intermediate_date
-                    intermediate_row['Note'] = 'Subscribed Billing'
-                    
-                    # Make sure we're using the correct account name with suffix if needed
-                    if sub_num > 1:
-                        intermediate_row['Account Name'] = f"{account_name}_{sub_num}"
-                    
-                    result_df.append(intermediate_row)
-                    
-                    # Move to the next month
-                    intermediate_date = intermediate_date + relativedelta(months=1)
+            base_row = None
+            if not pd.isna(current_date):
+                base_row = template_index.get((search_account_name, current_date))
+            
+            if base_row is not None:
+                billing_intervals.append(billing_interval(ledger_size(ledger), base_row, None,
+                                                          NOTE_SUBSCRIBED_BILLING))
+
+def resolve_as_of(as_of=None):
+    """
+    Returns the as-of date of a run: the given date (a date, datetime or YYYY-MM-DD string), or today.
+    """
+    if as_of is None:
+        return datetime.now().date()
+    return pd.Timestamp(as_of).date()
+
+def billing_cutoff(as_of=None):
+    """
+    Returns the moment Subscribed Billing stops: midnight after the as-of date, so every month
+    dated on or before the as-of date is billed (the same rows as billing up to datetime.now()
+    on that day).
+    """
+    return pd.Timestamp(resolve_as_of(as_of)) + pd.Timedelta(days=1)
+
+def expand_monthly_billing(intervals, as_of=None):
+    """
+    Expands Subscribed Billing intervals into one row per month, all at once.
     
-    # Convert the result list to a dataframe
-    result_df = pd.DataFrame(result_df)
+    Each interval bills its Date plus 1, 2, ... months while the date stays before End. Days are
+    clamped to the length of the month, and like repeated relativedelta(months=1) steps a clamped
+    day carries forward (Jan 31 -> Feb 28 -> Mar 28).
     
-    # Add special intermediate entries for specific accounts
-    result_df = add_special_intermediate_entries(result_df)
+    Args:
+        intervals (pd.DataFrame): Template ledger columns plus 'End' and 'Open Ended' (billed up to
+            the as-of date); extra columns are carried through
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
+        
+    Returns:
+        pd.DataFrame: The expanded rows (without 'End' and 'Open Ended'), in interval then date order
+    """
+    start = pd.to_datetime(intervals['Date'])
+    end = pd.to_datetime(intervals['End']).mask(intervals['Open Ended'].astype(bool), billing_cutoff(as_of))
     
-    # Convert Date back to string format for output
-    result_df['Date'] = result_df['Date'].dt.strftime('%m/%d/%Y')
+    # Upper bound on the number of months each interval can bill
+    start_month = start.dt.year * 12 + start.dt.month - 1
+    end_month = end.dt.year * 12 + end.dt.month - 1
+    months = (end_month - start_month).fillna(0).clip(lower=0).astype('int64').to_numpy()
     
-    # Replace spaces in column names with underscores for BigQuery compatibility
-    result_df.columns = [col.replace(' ', '_') for col in result_df.columns]
+    # Repeat each interval once per candidate month and number the months 1, 2, ...
+    take = np.repeat(np.arange(len(intervals)), months)
+    first_of_interval = np.repeat(np.cumsum(months) - months, months)
+    offset = np.arange(len(take)) - first_of_interval + 1
     
-    # Generate timestamp for the output file
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    month_index = start_month.fillna(0).astype('int64').to_numpy()[take] + offset
+    year = month_index // 12
+    month = month_index % 12 + 1
     
-    # Create output filename and save the processed data
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    output_file = f'Quick_Assist_Ledger_Output_{timestamp}.csv'
-    output_path = os.path.join(output_dir, output_file)
+    # Clamp the day to the shortest month seen so far in each interval
+    days_in_month = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': 1})).dt.days_in_month
+    shortest_month = days_in_month.groupby(take).cummin().to_numpy()
+    day = np.minimum(start.dt.day.fillna(1).astype('int64').to_numpy()[take], shortest_month)
     
-    result_df.to_csv(output_path, index=False)
-    print(f"Processing complete. Output saved to {output_path}")
+    time_of_day = (start - start.dt.normalize()).to_numpy()[take]
+    dates = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day})).to_numpy() + time_of_day
     
-    # Calculate and display the number of active subscribers
-    # First convert back to datetime for proper filtering
-    result_df['Date'] = pd.to_datetime(result_df['Date'])
+    expanded = intervals.iloc[take].drop(columns=['End', 'Open Ended'])
+    expanded['Date'] = dates
     
-    # Filter for only subscription type accounts (Product_Code = 350-0100)
-    subscription_df = result_df[result_df['Product_Code'] == '350-0100']
+    return expanded[dates < end.to_numpy()[take]]
+
+def billing_interval_table(emitted, billing_intervals):
+    """
+    Builds the table of (template row, start, end, amount) intervals for expand_monthly_billing.
     
-    # Sort by Account_Name and Date in descending order
-    subscription_df = subscription_df.sort_values(by=['Account_Name', 'Date'], ascending=[True, False])
+    Args:
+        emitted (pd.DataFrame): The emitted ledger rows the interval templates point into
+        billing_intervals (list): Subscribed Billing intervals from billing_interval
+        
+    Returns:
+        pd.DataFrame: Template ledger columns plus 'End', 'Open Ended', '_position' and '_interval'
+    """
+    templates = [interval['template'] for interval in billing_intervals]
+    intervals = emitted.iloc[templates].reset_index(drop=True)
+    intervals['Note Code'] = [interval['note'] for interval in billing_intervals]
+    intervals['Note Suffix'] = [interval['suffix'] for interval in billing_intervals]
+    intervals['End'] = pd.to_datetime(pd.Series([interval['end'] for interval in billing_intervals], dtype=object))
+    intervals['Open Ended'] = [interval['end'] is None for interval in billing_intervals]
+    intervals['_position'] = [interval['position'] for interval in billing_intervals]
+    intervals['_interval'] = np.arange(len(billing_intervals))
     
-    # Drop duplicates, keeping the first occurrence (most recent) for each account
-    latest_entries = subscription_df.drop_duplicates(subset='Account_Name', keep='first')
+    return intervals
+
+def assemble_ledger(emitted, intervals, as_of=None):
+    """
+    Combines the emitted rows with the expanded billing intervals, placing each interval's
+    monthly rows before the row at its recorded position.
     
-    # Handle special cases before categorizing
-    for idx, row in latest_entries.iterrows():
-        account_name = row['Account_Name']
-        
-        # Case 1: Account status is "Churned" - regardless of current Note value
-        if row['Account_Status'] == 'Churned' and row['Opportunity_Type'] == 'Add Products':
-            latest_entries.at[idx, 'Note'] = 'Start of Subscription - Churned'
+    Args:
+        emitted (pd.DataFrame): The emitted ledger rows (see ledger_frame)
+        intervals (pd.DataFrame): Subscribed Billing intervals from billing_interval_table
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
         
-        # Case 2: Account status is NaN/null (inactive/disabled accounts) - regardless of current Note value
-        elif pd.isna(row['Account_Status']) and row['Opportunity_Type'] == 'Add Products':
-            latest_entries.at[idx, 'Note'] = 'Start of Subscription - Inactive'
-            
-        elif account_name == 'United Mortgage Lending':
-            latest_entries.at[idx, 'Note'] = 'Start of Subscription'
-            
-        # Case 4: Handle Copart, Inc directly and any amount 0 entries with On Demand equivalents
-        elif account_name == 'Copart, Inc' and row['Product_Code'] == '350-0100' and row['Amount'] == 0:
-            latest_entries.at[idx, 'Note'] = 'Start of Subscription - Swap'
-            
-        # Case 5: Amount is 0, Account is Active but Note is empty (possible swap to On Demand)
-        elif (row['Amount'] == 0 and row['Account_Status'] == 'Active' and 
-              row['Opportunity_Type'] == 'Add Products' and (pd.isna(row['Note']) or row['Note'] == '')):
-            # Check if there's an On Demand entry with the same Opportunity_ID
-            on_demand_entries = result_df[
-                (result_df['Account_Name'] == account_name) &
-                (result_df['Product_Code'] == '350-0101') &
-                (result_df['Opportunity_ID'] == row['Opportunity_ID'])
-            ]
-            
-            if len(on_demand_entries) > 0:
-                latest_entries.at[idx, 'Note'] = 'Start of Subscription - Swap'
+    Returns:
+        pd.DataFrame: The ledger in output order
+    """
+    if not len(intervals):
+        return emitted
     
-    # Filter for active subscribers based on the specified conditions
-    active_subscribers = latest_entries[
-        (latest_entries['Opportunity_Type'] == 'Add Products') &
-        ((latest_entries['Note'].str.contains('Start of Subscription', na=False)) | 
-         (latest_entries['Note'].str.contains('Subscribed Billing', na=False))) &
-        (~latest_entries['Note'].str.contains('Churned|Inactive|Swap', na=False)) &
-        (latest_entries['Account_Status'] == 'Active')
-    ]
+    expanded = expand_monthly_billing(intervals, as_of)
     
-    # Get the count and the list of active accounts
-    num_active_subscribers = active_subscribers['Account_Name'].nunique()
-    list_of_active_subscribers = active_subscribers['Account_Name'].unique().tolist()
+    # Order by position, expanded rows before the emitted row there, then by interval
+    position = np.concatenate([np.arange(len(emitted)), expanded['_position'].to_numpy()])
+    is_emitted = np.concatenate([np.ones(len(emitted), dtype=int), np.zeros(len(expanded), dtype=int)])
+    interval = np.concatenate([np.zeros(len(emitted), dtype=int), expanded['_interval'].to_numpy()])
+    order = np.lexsort((interval, is_emitted, position))
     
-    # Print the results to terminal
-    print("\n" + "="*50)
-    print(f"Number of active subscribers (Product_Code = 350-0100): {num_active_subscribers}")
-    print("\nList of all active subscribers:")
-    for account in sorted(list_of_active_subscribers):
-        print(f"- {account}")
-    print("="*50 + "\n")
+    combined = pd.concat([emitted, expanded[emitted.columns]], ignore_index=True)
     
-    # Filter for accounts whose most recent entry shows an ended subscription
-    # Now including our special cases as ended subscriptions
-    ended_subscription_accounts = latest_entries[
-        (latest_entries['Note'].str.contains('Reduction - End of Subscription', na=False)) |
-        (latest_entries['Note'].str.contains('Start of Subscription - Churned', na=False)) |
-        (latest_entries['Note'].str.contains('Start of Subscription - Inactive', na=False)) |
-        (latest_entries['Note'].str.contains('Start of Subscription - Swap', na=False))
-    ]
+    return combined.iloc[order].reset_index(drop=True)
 
-    # Get the count and the list of accounts with ended subscriptions
-    num_ended_subscriptions = ended_subscription_accounts['Account_Name'].nunique()
-    list_of_ended_subscriptions = ended_subscription_accounts['Account_Name'].unique().tolist()
-
-    # Print the results to terminal
-    print("\n" + "="*50)
-    print(f"Number of accounts with ended subscriptions (Product_Code = 350-0100): {num_ended_subscriptions}")
-    print("\nList of accounts whose most recent entry shows an ended subscription:")
-    for account in sorted(list_of_ended_subscriptions):
-        print(f"- {account}")
-    print("="*50 + "\n")
+def billed_months(intervals, as_of=None):
+    """
+    Returns the number of monthly rows expand_monthly_billing produces for each interval, without
+    expanding them.
+    
+    Every candidate month before the End month is billed; the row in the End month is billed only
+    if its (clamped) date is still before End. The clamped day there is the shortest month of the
+    interval: 28 or 29 when it covers a February, otherwise 30 when it covers a 30-day month.
+    
+    Args:
+        intervals (pd.DataFrame): Subscribed Billing intervals from billing_interval_table
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
+        
+    Returns:
+        np.ndarray: Number of billed months per interval
+    """
+    start = pd.to_datetime(intervals['Date'])
+    end = pd.to_datetime(intervals['End']).mask(intervals['Open Ended'].astype(bool), billing_cutoff(as_of))
     
-    # Find accounts that are neither active subscribers nor ended subscriptions
-    all_accounts = set(latest_entries['Account_Name'].unique())
-    active_accounts = set(active_subscribers['Account_Name'].unique())
-    ended_accounts = set(ended_subscription_accounts['Account_Name'].unique())
-    other_status_accounts = all_accounts - (active_accounts | ended_accounts)
+    start_month = start.dt.year * 12 + start.dt.month - 1
+    end_month = end.dt.year * 12 + end.dt.month - 1
+    months = (end_month - start_month).fillna(0).clip(lower=0).astype('int64').to_numpy()
+    
+    # Shortest month among the candidate months (month indices first..last, January = 0)
+    billing = months > 0
+    first = start_month.to_numpy()[billing].astype('int64') + 1
+    last = end_month.to_numpy()[billing].astype('int64')
+    februaries = (last - 1) // 12 - (first - 2) // 12
+    thirty_day_months = sum((last - month) // 12 - (first - 1 - month) // 12 for month in [3, 5, 8, 10])
+    february_year = (first + (1 - first) % 12) // 12
+    leap_year = (february_year % 4 == 0) & ((february_year % 100 != 0) | (february_year % 400 == 0))
+    shortest_month = np.select([februaries >= 2, februaries == 1, thirty_day_months > 0],
+                               [28, np.where(leap_year, 29, 28), 30], 31)
+    
+    # Date of the candidate row in the End month
+    start_day = start.dt.day.to_numpy()[billing].astype('int64')
+    last_dates = pd.to_datetime(pd.DataFrame({'year': last // 12, 'month': last % 12 + 1,
+                                              'day': np.minimum(start_day, shortest_month)}))
+    last_dates = last_dates.to_numpy() + (start - start.dt.normalize()).to_numpy()[billing]
+    
+    months[billing] -= last_dates >= end.to_numpy()[billing]
+    return months
 
-    # Get count and list of these "other status" accounts
-    num_other_status = len(other_status_accounts)
-    list_other_status = sorted(list(other_status_accounts))
+def monthly_ledger_amounts(plan, as_of=None):
+    """
+    Totals the ledger amounts per month straight from a ledger plan, without materializing the
+    Subscribed Billing rows: each interval adds its amount to a running total from its first to
+    its last billed month.
+    
+    The totals are those of the expanded ledger before the special intermediate entries.
+    
+    Args:
+        plan (dict): Ledger plan from plan_ledger
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
+        
+    Returns:
+        pd.DataFrame: 'Subscribed Billing' and 'Amount' (all ledger rows) in cents, indexed by month
+    """
+    intervals = pd.concat([plan['intervals'], plan['multiple_subscription_intervals']], ignore_index=True)
+    months = billed_months(intervals, as_of)
+    
+    # +amount in the first billed month, -amount after the last one, then a running total
+    billing = months > 0
+    first = (intervals['Date'].dt.year * 12 + intervals['Date'].dt.month).to_numpy()[billing].astype('int64')
+    amount = intervals['Amount'].fillna(0).to_numpy('int64')[billing]
+    changes = pd.concat([pd.Series(amount, index=first), pd.Series(-amount, index=first + months[billing])])
+    changes = changes.groupby(level=0).sum()
+    if len(changes):
+        changes = changes.reindex(np.arange(changes.index.min(), changes.index.max() + 1), fill_value=0)
+    subscribed_billing = changes.cumsum().iloc[:-1]
+    month_index = subscribed_billing.index.to_numpy()
+    subscribed_billing.index = pd.to_datetime(pd.DataFrame({'year': month_index // 12, 'month': month_index % 12 + 1,
+                                                            'day': 1})).dt.to_period('M')
+    
+    emitted = plan['rows'].dropna(subset=['Date'])
+    emitted_amounts = emitted['Amount'].fillna(0).groupby(emitted['Date'].dt.to_period('M')).sum()
+    
+    totals = pd.DataFrame({'Subscribed Billing': subscribed_billing})
+    totals = totals.join(emitted_amounts.rename('Amount'), how='outer').fillna(0).astype('int64')
+    totals['Amount'] += totals['Subscribed Billing']
+    totals.index.name = 'Month'
+    return totals
 
-    # Print the results
-    print("\n" + "="*50)
-    print(f"Number of subscription accounts with other status (Product_Code = 350-0100): {num_other_status}")
-    print(f"Total subscription accounts across all categories: {num_active_subscribers + num_ended_subscriptions + num_other_status}")
-    print("\nList of subscription accounts with other status and their current state:")
-    for account in list_other_status:
-        # Get the most recent entry for this account to show its actual status
-        account_entry = latest_entries[latest_entries['Account_Name'] == account].iloc[0]
-        status_info = f"Note: {account_entry['Note']}, Opportunity_Type: {account_entry['Opportunity_Type']}, Account_Status: {account_entry['Account_Status']}"
-        print(f"- {account} ({status_info})")
-    print("="*50 + "\n")
+def iter_ledger_plan(plan, as_of=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Materializes a ledger plan lazily, in output order: about chunk_rows ledger rows at a time,
+    expanding only the billing intervals of the rows being produced. Memory stays proportional to
+    the plan (one row per subscription) plus one chunk.
     
-    # Display information about accounts with multiple subscriptions
-    multiple_sub_accounts = [account for account in active_subscribers['Account_Name'].unique() if '_' in account]
-    # Get the base account names (without suffixes)
-    base_account_names = set()
-    for account in multiple_sub_accounts:
-        if '_' in account:
-            base_name = account.split('_')[0]
-            base_account_names.add(base_name)
+    The concatenated chunks are combine_ledger_parts(expand_ledger_plan(plan, as_of)).
     
-    # Add base account names that exist in the active subscribers list
-    for account in active_subscribers['Account_Name'].unique():
-        if '_' not in account and any(account + '_' in sub for sub in multiple_sub_accounts):
-            base_account_names.add(account)
+    Args:
+        plan (dict): Ledger plan from plan_ledger
+        as_of (date, optional): Last billing date of the open-ended intervals (defaults to today)
+        chunk_rows (int): Approximate number of ledger rows per chunk
+        
+    Yields:
+        pd.DataFrame: The next ledger rows
+    """
+    emitted = plan['rows']
+    intervals = plan['intervals']
     
-    print("\n" + "="*50)
-    print(f"Number of accounts with multiple subscriptions: {len(base_account_names)}")
-    print("\nAccounts with multiple subscriptions:")
-    for account in sorted(base_account_names):
-        # Find all variants of this account (base and with suffixes)
-        variants = [acct for acct in active_subscribers['Account_Name'].unique() 
-                   if acct == account or acct.startswith(account + '_')]
-        print(f"- {account} ({', '.join(sorted(variants))})")
-    print("="*50 + "\n")
+    # Cut the emitted rows where the rows so far, with their billing, reach chunk_rows
+    rows_before = np.bincount(intervals['_position'], weights=billed_months(intervals, as_of),
+                              minlength=len(emitted) + 1)[:len(emitted)] + 1
+    chunk = np.cumsum(rows_before) // chunk_rows
+    bounds = np.flatnonzero(np.diff(chunk, prepend=-1)).tolist() + [len(emitted)]
     
-    # Copy the current script to the destination folder
-    script_dest_folder = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Revenue Dashboard\QuickAssist_Ledger"
-    try:
-        # Get the current script path
-        current_script_path = os.path.abspath(__file__)
-        script_filename = os.path.basename(current_script_path)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        # Intervals placed after the last emitted row go with the last chunk
+        positions = intervals['_position']
+        in_chunk = (positions >= lo) & ((positions < hi) | (hi == len(emitted)))
+        yield assemble_ledger(emitted.iloc[lo:hi].reset_index(drop=True),
+                              intervals[in_chunk].assign(_position=positions[in_chunk] - lo), as_of)
+    
+    # The Subscribed Billing of the accounts with multiple subscriptions comes last
+    multiple_subscription_intervals = plan['multiple_subscription_intervals']
+    chunk = np.cumsum(billed_months(multiple_subscription_intervals, as_of)) // chunk_rows
+    for _, chunk_intervals in multiple_subscription_intervals.groupby(chunk, sort=False):
+        expanded = expand_monthly_billing(chunk_intervals, as_of)[emitted.columns]
+        if len(expanded):
+            yield expanded.reset_index(drop=True)
+
+def split_account_groups(df):
+    """
+    Splits the sorted dataframe into contiguous (Account Name, Product Code) runs.
+    Rows with a missing account or product code never join the previous row's group.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe
         
-        # Create the destination folder if it doesn't exist
-        if not os.path.exists(script_dest_folder):
-            os.makedirs(script_dest_folder)
-            print(f"Created directory: {script_dest_folder}")
+    Returns:
+        list: (start, end) row positions of each group, end exclusive, in frame order
+    """
+    keys = df[['Account Name', 'Product Code']]
+    starts = np.flatnonzero(~keys.eq(keys.shift(1)).all(axis=1).to_numpy(dtype=bool))
+    ends = np.append(starts[1:], len(df))
+    
+    return list(zip(starts.tolist(), ends.tolist()))
+
+def note_fields(note, suffix=""):
+    """
+    Returns the ledger Note fields (enum code and suffix) as row overrides.
+    """
+    return {'Note Code': note, 'Note Suffix': suffix}
+
+def render_note(note, suffix):
+    """
+    Returns the legacy Note text of a Note code and suffix, e.g. "Subscribed Billing - Swap".
+    """
+    text = NOTE_TEXT[note]
+    if not suffix:
+        return text
+    return f"{text} {suffix}" if text else suffix
+
+def render_notes(notes, suffixes):
+    """
+    Renders the legacy Note text of a whole column of Note codes and suffixes for output.
+    
+    Args:
+        notes (pd.Series): Note codes
+        suffixes (pd.Series): Note suffixes
         
-        # Copy the script to the destination
-        dest_script_path = os.path.join(script_dest_folder, script_filename)
-        shutil.copy2(current_script_path, dest_script_path)
-        print(f"Script copied to: {dest_script_path}")
-    except Exception as e:
-        print(f"Error copying script to destination folder: {e}")
+    Returns:
+        pd.Series: The Note text
+    """
+    text = pd.Series(np.array(NOTE_TEXT, dtype=object)[notes.to_numpy(dtype='int64')], index=notes.index)
+    has_suffix = (suffixes != "").to_numpy()
+    if has_suffix.any():
+        text[has_suffix] = [render_note(note, suffix)
+                            for note, suffix in zip(notes[has_suffix], suffixes[has_suffix])]
     
-    # Move the source file to the archive directory
-    try:
-        archive_path = os.path.join(archive_dir, os.path.basename(file_path))
-        shutil.move(file_path, archive_path)
-        print(f"Source file moved to: {archive_path}")
-    except Exception as e:
-        print(f"Error moving source file to archive: {e}")
+    return text
+
+def mark_duplicates(df):
+    """
+    Flags rows that repeat the previous row's account, product, opportunity ID and amount.
+    The dataframe must already be sorted by Account Name, Product Code and Date.
+    
+    Args:
+        df (pd.DataFrame): The sorted Closed Won dataframe
+        
+    Returns:
+        numpy.ndarray: Boolean mask by row position, True where the row is a duplicate
+    """
+    duplicate_cols = ['Account Name', 'Product Code', 'Opportunity ID', 'Amount']
+    
+    # Compare every row with the one before it in a single shifted pass.
+    # Missing values never compare equal, matching the row-by-row check this replaces.
+    keys = df[duplicate_cols]
+    matches_previous = keys.eq(keys.shift(1)).fillna(False).all(axis=1)
+    
+    return matches_previous.to_numpy(dtype=bool)
 
 def add_special_intermediate_entries(result_df):
     """
@@ -663,8 +2535,31 @@ def add_special_intermediate_entries(result_df):
     if df['Date'].dtype != 'datetime64[ns]':
         df['Date'] = pd.to_datetime(df['Date'])
     
-    # New rows to be added
-    new_rows = []
+    new_rows = special_intermediate_entries(df)
+    
+    # Add the new rows to the original dataframe
+    if len(new_rows):
+        result_df = pd.concat([df, new_rows], ignore_index=True)
+        
+        # Sort by Account_Name and Date
+        account_col = 'Account_Name' if 'Account_Name' in df.columns else 'Account Name'
+        result_df = result_df.sort_values(by=[account_col, 'Date'])
+    
+    return result_df
+
+def special_intermediate_entries(df):
+    """
+    Builds the special intermediate date entries of the accounts in SPECIAL_ENTRY_ACCOUNTS, copying
+    the first ledger row of each account.
+    
+    Args:
+        df (pd.DataFrame): Ledger rows with Date as datetime (the whole ledger, or whole accounts of it)
+        
+    Returns:
+        pd.DataFrame: The special entries, in SPECIAL_ENTRY_ACCOUNTS order (empty if df has none of them)
+    """
+    # New rows to be added, one list per column
+    new_rows = new_ledger(df.columns)
     
     # Check if columns have been renamed with underscores
     account_col = 'Account_Name' if 'Account_Name' in df.columns else 'Account Name'
@@ -673,7 +2568,7 @@ def add_special_intermediate_entries(result_df):
     adt_entries = df[df[account_col] == 'ADT Solar LLC (fka SUNPRO)'].copy()
     if not adt_entries.empty:
         # Find the original entry to use as a template
-        template_row = adt_entries.iloc[0].copy()
+        template_row = adt_entries.iloc[0]
         
         # Create entries for each month from 2/2/2024 to 8/2/2024
         start_date = datetime(2024, 2, 2)
@@ -681,17 +2576,14 @@ def add_special_intermediate_entries(result_df):
         
         current_date = start_date
         while current_date <= end_date:
-            new_row = template_row.copy()
-            new_row['Date'] = current_date
-            new_row['Note'] = "Subscribed Billing"
-            new_rows.append(new_row)
+            append_ledger_row(new_rows, template_row, {'Date': current_date, **note_fields(NOTE_SUBSCRIBED_BILLING)})
             current_date = current_date + relativedelta(months=1)
     
     # 2. Electronic Caregiver - Monthly entries from 4/21/2025 to 6/21/2025 + special entry
     ec_entries = df[df[account_col] == 'Electronic Caregiver'].copy()
     if not ec_entries.empty:
         # Find the original entry to use as a template
-        template_row = ec_entries.iloc[0].copy()
+        template_row = ec_entries.iloc[0]
         
         # Create entries for each month from 4/21/2025 to 6/21/2025
         start_date = datetime(2025, 4, 21)
@@ -699,52 +2591,33 @@ def add_special_intermediate_entries(result_df):
         
         current_date = start_date
         while current_date <= end_date:
-            new_row = template_row.copy()
-            new_row['Date'] = current_date
-            new_row['Note'] = "Subscribed Billing"
-            new_rows.append(new_row)
+            append_ledger_row(new_rows, template_row, {'Date': current_date, **note_fields(NOTE_SUBSCRIBED_BILLING)})
             current_date = current_date + relativedelta(months=1)
         
-        # Add special entry for 7/14/2025 with amount 12.58
-        special_row = template_row.copy()
-        special_row['Date'] = datetime(2025, 7, 14)
-        special_row['Amount'] = 12.58
-        special_row['Note'] = "Subscribed Billing"
-        new_rows.append(special_row)
+        # Add special entry for 7/14/2025 with amount 12.58 (in cents)
+        append_ledger_row(new_rows, template_row,
+                          {'Date': datetime(2025, 7, 14), 'Amount': 1258, **note_fields(NOTE_SUBSCRIBED_BILLING)})
     
     # 3. Sun Source Energy - Special entry for 12/11/2024 + monthly entries from 1/11/2025 to 6/11/2025
     sse_entries = df[df[account_col] == 'Sun Source Energy'].copy()
     if not sse_entries.empty:
         # Find the original entry to use as a template
-        template_row = sse_entries.iloc[0].copy()
+        template_row = sse_entries.iloc[0]
         
         # Add special entry for 12/11/2024
-        special_row = template_row.copy()
-        special_row['Date'] = datetime(2024, 12, 11)
-        special_row['Note'] = "Subscribed Billing"
-        new_rows.append(special_row)
+        append_ledger_row(new_rows, template_row, {'Date': datetime(2024, 12, 11), **note_fields(NOTE_SUBSCRIBED_BILLING)})
         
-        # Create entries for each month from 1/11/2025 to 6/11/2025 with amount 414.75
+        # Create entries for each month from 1/11/2025 to 6/11/2025 with amount 414.75 (in cents)
         start_date = datetime(2025, 1, 11)
         end_date = datetime(2025, 6, 11)
         
         current_date = start_date
         while current_date <= end_date:
-            new_row = template_row.copy()
-            new_row['Date'] = current_date
-            new_row['Amount'] = 414.75
-            new_row['Note'] = "Subscribed Billing"
-            new_rows.append(new_row)
+            append_ledger_row(new_rows, template_row,
+                              {'Date': current_date, 'Amount': 41475, **note_fields(NOTE_SUBSCRIBED_BILLING)})
             current_date = current_date + relativedelta(months=1)
     
-    # Add the new rows to the original dataframe
-    if new_rows:
-        result_df = pd.concat([df, pd.DataFrame(new_rows)], ignore_index=True)
-        
-        # Sort by Account_Name and Date
-        result_df = result_df.sort_values(by=[account_col, 'Date'])
-    
-    return result_df
+    return ledger_frame(new_rows)
 
 def identify_multiple_subscriptions(df):
     """
@@ -764,80 +2637,89 @@ def identify_multiple_subscriptions(df):
     amount_col = 'Amount'
     
     # Filter for Service Optimization entries (Product Code 350-0100)
-    so_df = df[df[product_col] == '350-0100'].copy()
+    so_df = df[df[product_col] == '350-0100']
     
-    # Sort by Account Name and Date
+    # Sort by Account Name and Date once; every step below works on this order
     so_df = so_df.sort_values(by=[account_col, date_col]).reset_index(drop=True)
     
+    # Skip special case for Copart, Inc - it's not actually a multiple subscription
+    so_df = so_df[so_df[account_col] != 'Copart, Inc'].reset_index(drop=True)
+    
+    accounts = so_df[account_col]
+    dates = so_df[date_col]
+    opportunity_types = so_df[opportunity_type_col]
+    amounts = so_df[amount_col]
+    
+    # "Add Products" entries with positive amounts start a subscription; Reduction, Debook and
+    # negative "Add Products" entries reduce one
+    is_start = (opportunity_types == 'Add Products') & amounts.gt(0).fillna(False).astype(bool)
+    is_reduction = (opportunity_types.isin(['Reduction', 'Debook']) |
+                    ((opportunity_types == 'Add Products') & amounts.lt(0).fillna(False).astype(bool)))
+    
+    # Cumulative start counters per account: starts strictly before each row's date,
+    # starts on that date, and dated starts overall
+    starts_so_far = is_start.astype(int).groupby(accounts).cumsum()
+    starts_through_date = starts_so_far.groupby([accounts, dates]).transform('last')
+    starts_on_date = is_start.astype(int).groupby([accounts, dates]).transform('sum')
+    starts_before = starts_through_date - starts_on_date
+    dated_starts = (is_start & dates.notna()).astype(int).groupby(accounts).transform('sum')
+    
+    # A reduction lies strictly between two consecutive start dates when some start is earlier,
+    # some start is later and none falls on the same date
+    between = (is_reduction & dates.notna() & (starts_before > 0) & (starts_on_date == 0) &
+               (starts_before < dated_starts))
+    accounts_with_reduction_between = set(accounts[between])
+    
+    # Skip accounts whose most recent entry is not active
+    latest_status = so_df.drop_duplicates(subset=account_col, keep='last').set_index(account_col)[status_col]
+    active_accounts = set(latest_status.index[latest_status == 'Active'])
+    
+    start_sub_entries = so_df[is_start & accounts.isin(active_accounts - accounts_with_reduction_between)]
+    
     # Initialize a dictionary to store results
     accounts_with_multiple_subs = {}
     
-    # Get unique account names
-    account_names = so_df[account_col].unique()
-    
-    # Process each account
-    for account_name in account_names:
-        # Skip special case for Copart, Inc - it's not actually a multiple subscription
-        if account_name == "Copart, Inc":
-            continue
-            
-        # Get all entries for this account
-        account_entries = so_df[so_df[account_col] == account_name].copy()
-        
-        # Skip if account is not active
-        latest_status = account_entries[status_col].iloc[-1]
-        if latest_status != 'Active':
+    # Store the subscription dates and amounts of every account with at least two starts
+    for account_name, entries in start_sub_entries.groupby(account_col, sort=False):
+        if len(entries) < 2:
             continue
-        
-        # Find "Add Products" entries with positive amounts
-        start_sub_entries = account_entries[
-            (account_entries[opportunity_type_col] == 'Add Products') & 
-            (account_entries[amount_col] > 0)
+        accounts_with_multiple_subs[account_name] = [
+            {'date': date, 'amount': amount}
+            for date, amount in zip(entries[date_col], entries[amount_col])
         ]
-        
-        if len(start_sub_entries) < 2:
-            continue
-            
-        # Sort the Start of Subscription entries by date
-        start_sub_entries = start_sub_entries.sort_values(by=date_col)
-        start_dates = start_sub_entries[date_col].tolist()
-        
-        # Check for any Reduction or Debook entries between ANY pair of Start of Subscription dates
-        has_reduction_between = False
-        
-        for i in range(len(start_dates) - 1):
-            current_date = start_dates[i]
-            next_date = start_dates[i + 1]
-            
-            # Find entries between these two Start of Subscription dates
-            entries_between = account_entries[
-                (account_entries[date_col] > current_date) & 
-                (account_entries[date_col] < next_date)
-            ]
-            
-            # Check if any of these entries are Reductions or Deductions
-            reduction_entries = entries_between[
-                (entries_between[opportunity_type_col].isin(['Reduction', 'Debook'])) | 
-                ((entries_between[opportunity_type_col] == 'Add Products') & (entries_between[amount_col] < 0))
-            ]
-            
-            if len(reduction_entries) > 0:
-                has_reduction_between = True
-                break
-        
-        # If there are no reductions between any Start of Subscription entries, this is what we're looking for
-        if not has_reduction_between:
-            # Store the subscription dates and amounts
-            subscriptions = []
-            for idx, row in start_sub_entries.iterrows():
-                subscriptions.append({
-                    'date': row[date_col],
-                    'amount': row[amount_col]
-                })
-            
-            accounts_with_multiple_subs[account_name] = subscriptions
     
     return accounts_with_multiple_subs
 
 if __name__ == "__main__":
-    process_closed_won_opportunities()
+    parser = argparse.ArgumentParser(description="Build the Quick Assist ledger from the Closed Won exports in the In directory.")
+    parser.add_argument('--parallel', action='store_true',
+                        help="Process several input files at the same time in worker processes")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes for --parallel (default: number of CPUs)")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="Split each export into this many account shards processed in worker processes")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read exports sorted by Account Name in chunks and write the CSV output one batch of "
+                             "accounts at a time")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Recompute only the accounts that changed since the previous incremental run")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Output file format; parquet also writes a BigQuery schema JSON (requires pyarrow)")
+    parser.add_argument('--partition-by-month', action='store_true',
+                        help="Write the ledger as a month=YYYY-MM/ directory tree with a manifest per partition")
+    parser.add_argument('--as-of', default=None,
+                        help="Bill subscriptions up to and including this date, YYYY-MM-DD (default: today)")
+    parser.add_argument('--cache', action='store_true',
+                        help=f"Reuse the ledger of an unchanged export within the same billing month "
+                             f"(cached in {LEDGER_CACHE_DIR})")
+    parser.add_argument('--store', action='store_true',
+                        help=f"Upsert each ledger into the SQLite ledger store {LEDGER_STORE_FILE} in the output directory")
+    parser.add_argument('--profile', action='store_true',
+                        help=f"Record time, memory and row counts per stage in {PROFILE_LOG_FILE} "
+                             f"(or set {PROFILE_ENV_VAR}=1)")
+    args = parser.parse_args()
+    
+    process_closed_won_opportunities(parallel=args.parallel, max_workers=args.workers, shards=args.shards,
+                                     stream=args.stream, incremental=args.incremental, output_format=args.format,
+                                     partition_by_month=args.partition_by_month, profile=args.profile,
+                                     as_of=args.as_of, cache=args.cache, store=args.store)
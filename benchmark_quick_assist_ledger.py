@@ -0,0 +1,215 @@
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import importlib.util
+from datetime import datetime
+
+import pandas as pd
+
+import Quick_Assist_Ledger_V4 as ledger
+from generate_closed_won_export import generate_closed_won, write_closed_won_export
+
+# Export sizes (rows) benchmarked by default
+BENCHMARK_SIZES = [10000, 100000, 1000000]
+
+# Benchmark results log (one JSON line per benchmarked size and run)
+BENCHMARK_RESULTS_FILE = 'benchmark_results.jsonl'
+
+def run_benchmark(sizes=BENCHMARK_SIZES, seed=0, repeat=1, profile=False, work_dir=None, **options):
+    """
+    Times Quick_Assist_Ledger_V4.process_file on synthetic exports of the given sizes.
+
+    Each export is generated once per size (generate_closed_won with the given seed) and processed
+    `repeat` times; the stage timings of every run come from the run report. With profile=True the
+    runs are also profiled, which adds the engine's stages and memory figures but slows the run down.
+
+    Args:
+        sizes (list): Export sizes in rows
+        seed (int): Seed of the synthetic exports
+        repeat (int): Number of runs per size
+        profile (bool): Whether to profile the runs (see process_file)
+        work_dir (str, optional): Directory for the exports and outputs (defaults to a temporary directory)
+        **options: Extra keyword arguments for process_file (e.g. shards, stream); streamed
+            runs get exports sorted by Account Name
+
+    Returns:
+        list: One result dict per size and run
+    """
+    cleanup = work_dir is None
+    if cleanup:
+        work_dir = tempfile.mkdtemp(prefix='quick_assist_benchmark_')
+
+    # Streaming needs an export sorted by Account Name, otherwise the run falls back to a full load
+    sort_by_account = bool(options.get('stream'))
+
+    results = []
+    try:
+        for size in sizes:
+            export_name = f'closed_won_{size}_{seed}_sorted.csv' if sort_by_account else f'closed_won_{size}_{seed}.csv'
+            export_path = os.path.join(work_dir, export_name)
+            if not os.path.exists(export_path):
+                write_closed_won_export(generate_closed_won(size, seed=seed, sort_by_account=sort_by_account),
+                                        export_path)
+
+            for run in range(repeat):
+                results.append(benchmark_run(export_path, size, seed, run, work_dir, profile, **options))
+                print_benchmark_result(results[-1])
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return results
+
+def benchmark_run(export_path, size, seed, run, work_dir, profile=False, **options):
+    """
+    Processes one synthetic export and collects its timings.
+
+    Returns:
+        dict: Run details, total seconds, the per-stage timings and (when profiling) the stage profile
+    """
+    output_dir = os.path.join(work_dir, f'out_{size}_{run}')
+    archive_dir = os.path.join(work_dir, 'archived')
+    for dir_path in [output_dir, archive_dir]:
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+    # The ledger's console output is not part of the benchmark
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        output_path = ledger.process_file(export_path, output_dir, archive_dir, manage_files=False,
+                                          profile=profile, **options)
+    total_seconds = time.perf_counter() - started
+
+    if output_path is None:
+        raise RuntimeError(f"Processing {export_path} failed")
+
+    with open(os.path.splitext(output_path)[0] + '_report.json') as report_file:
+        report = json.load(report_file)
+
+    result = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'engine_version': ledger.ledger_engine_version(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'pyarrow': importlib.util.find_spec('pyarrow') is not None,
+        'rows': size,
+        'seed': seed,
+        'run': run,
+        'options': options,
+        'ledger_rows': count_rows(output_path),
+        'total_seconds': round(total_seconds, 6),
+        'stages': report['timings'],
+    }
+
+    if profile:
+        with open(os.path.join(output_dir, ledger.PROFILE_LOG_FILE)) as log_file:
+            result['profile'] = json.loads(log_file.read().splitlines()[-1])['stages']
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return result
+
+def count_rows(output_path):
+    """
+    Returns the number of ledger rows of a CSV output file.
+    """
+    with open(output_path) as output_file:
+        return sum(1 for _ in output_file) - 1
+
+def print_benchmark_result(result):
+    """
+    Prints one benchmark result as a single line of stage timings.
+    """
+    stages = ', '.join(f"{stage} {seconds:.3f}s" for stage, seconds in result['stages'].items())
+    print(f"{result['rows']:>9} rows (run {result['run'] + 1}): {result['total_seconds']:.3f}s total "
+          f"-> {result['ledger_rows']} ledger rows ({stages})")
+
+def record_benchmark_results(results, results_path=BENCHMARK_RESULTS_FILE):
+    """
+    Appends benchmark results to the results log.
+
+    Args:
+        results (list): Results from run_benchmark
+        results_path (str): Path of the JSON lines results log
+    """
+    with open(results_path, 'a') as results_file:
+        for result in results:
+            results_file.write(json.dumps(result) + '\n')
+
+def compare_with_previous(results, results_path=BENCHMARK_RESULTS_FILE):
+    """
+    Prints the best total time of each size next to the best time recorded for it by the previous
+    engine version in the results log, with the same options and profiling setting (profiled runs
+    are several times slower).
+
+    Args:
+        results (list): Results from run_benchmark
+        results_path (str): Path of the JSON lines results log
+    """
+    if not os.path.exists(results_path):
+        return
+
+    with open(results_path) as results_file:
+        previous = [json.loads(line) for line in results_file if line.strip()]
+    if not results:
+        return
+
+    engine_version = results[0]['engine_version']
+    options = results[0]['options']
+    profiled = 'profile' in results[0]
+    comparable = [result for result in previous
+                  if result['engine_version'] != engine_version and result['options'] == options and
+                  ('profile' in result) == profiled]
+    if not comparable:
+        return
+
+    # The most recent other engine version in the log
+    baseline_version = comparable[-1]['engine_version']
+    baseline = {}
+    for result in comparable:
+        if result['engine_version'] == baseline_version:
+            baseline[result['rows']] = min(baseline.get(result['rows'], float('inf')), result['total_seconds'])
+
+    print("\n" + "="*50)
+    print(f"Compared with engine version {baseline_version}:")
+    best = {}
+    for result in results:
+        best[result['rows']] = min(best.get(result['rows'], float('inf')), result['total_seconds'])
+    for size in sorted(best):
+        if size in baseline:
+            print(f"- {size} rows: {best[size]:.3f}s vs {baseline[size]:.3f}s ({baseline[size] / best[size]:.2f}x)")
+    print("="*50 + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Quick_Assist_Ledger_V4.py on synthetic Closed Won exports.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES,
+                        help="Export sizes in rows (default: 10000 100000 1000000)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic exports (default: 0)")
+    parser.add_argument('--repeat', type=int, default=1, help="Number of runs per size (default: 1)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Also record the engine's stages and memory (slows the runs down)")
+    parser.add_argument('--shards', type=int, default=1, help="Passed on to process_file")
+    parser.add_argument('--stream', action='store_true',
+                        help="Run with --stream on exports sorted by Account Name")
+    parser.add_argument('--work-dir', default=None,
+                        help="Keep the generated exports in this directory instead of a temporary one")
+    parser.add_argument('--results', default=BENCHMARK_RESULTS_FILE,
+                        help=f"Results log to append to (default: {BENCHMARK_RESULTS_FILE})")
+    args = parser.parse_args()
+
+    options = {}
+    if args.shards > 1:
+        options['shards'] = args.shards
+    if args.stream:
+        options['stream'] = True
+
+    results = run_benchmark(args.sizes, seed=args.seed, repeat=args.repeat, profile=args.profile,
+                            work_dir=args.work_dir, **options)
+    compare_with_previous(results, args.results)
+    record_benchmark_results(results, args.results)
+    print(f"Benchmark results appended to {args.results}")
@@ -0,0 +1,402 @@
+import os
+import io
+import re
+import sys
+import glob
+import json
+import shutil
+import inspect
+import argparse
+import tempfile
+import contextlib
+import importlib.util
+from datetime import datetime
+
+import pandas as pd
+
+from generate_closed_won_export import generate_closed_won, write_closed_won_export
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Reference implementation: a frozen copy of V4 from before the engine rewrite, which shares no code
+# with the current script (duplicate detection, amounts, Notes and the report are all its own)
+REFERENCE_SCRIPT = os.path.join(SCRIPT_DIR, 'Quick_Assist_Ledger_V4_reference.py')
+
+# Ledger script compared with the reference by default
+CANDIDATE_SCRIPT = os.path.join(SCRIPT_DIR, 'Quick_Assist_Ledger_V4.py')
+
+# Run report fields that differ between runs by design
+REPORT_RUN_FIELDS = ['source_file', 'output', 'timings']
+
+# Count lines of the subscription classification printed by scripts without a run report, by report count
+CONSOLE_REPORT_COUNTS = {
+    'active': 'Number of active subscribers',
+    'ended': 'Number of accounts with ended subscriptions',
+    'other_status': 'Number of subscription accounts with other status',
+    'total': 'Total subscription accounts across all categories',
+    'multiple_subscriptions': 'Number of accounts with multiple subscriptions',
+}
+
+# Headings of the printed account lists, by run report field
+CONSOLE_REPORT_LISTS = {
+    'active_subscribers': 'List of all active subscribers:',
+    'ended_subscriptions': 'List of accounts whose most recent entry shows an ended subscription:',
+    'other_status': 'List of subscription accounts with other status and their current state:',
+    'multiple_subscriptions': 'Accounts with multiple subscriptions:',
+}
+
+def load_ledger_module(script_path, module_name):
+    """
+    Imports a ledger script (e.g. Quick_Assist_Ledger_V4.py or a candidate copy of it) as a module.
+    """
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+@contextlib.contextmanager
+def pinned_now(module, now):
+    """
+    Pins datetime.now() inside a ledger module, so open-ended subscriptions bill up to the same month
+    on every run. Worker processes started with fork (e.g. shards on Linux) inherit the pinned clock.
+
+    Args:
+        module: The ledger module
+        now (datetime): The pinned current date and time
+    """
+    real_datetime = module.datetime
+
+    class PinnedDatetime(real_datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(now.year, now.month, now.day, now.hour, now.minute, now.second)
+
+    module.datetime = PinnedDatetime
+    try:
+        yield
+    finally:
+        module.datetime = real_datetime
+
+def run_ledger(module, export_path, work_dir, now, **options):
+    """
+    Runs a ledger module's process_file on a copy of an export with a pinned now.
+
+    Only the options the module's process_file accepts are passed, so older scripts (e.g. the
+    reference, which has no options and always archives its input) can be run too. The run
+    happens inside work_dir, so anything such a script writes next to itself stays there.
+
+    Returns:
+        tuple: (ledger dataframe with every value as text, run report without the per-run fields;
+                for scripts that don't write one, the classification they print (see
+                parse_console_report), stages timed in the run report, or None without one)
+    """
+    input_dir = os.path.join(work_dir, 'in')
+    output_dir = os.path.join(work_dir, 'out')
+    archive_dir = os.path.join(work_dir, 'archived')
+    for dir_path in [input_dir, output_dir, archive_dir]:
+        if not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+    input_path = shutil.copy(export_path, input_dir)
+    parameters = inspect.signature(module.process_file).parameters
+    options = {key: value for key, value in dict(options, manage_files=False).items() if key in parameters}
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    console = io.StringIO()
+    try:
+        with pinned_now(module, now), contextlib.redirect_stdout(console):
+            output_path = module.process_file(input_path, output_dir, archive_dir, **options)
+    finally:
+        os.chdir(cwd)
+
+    # Scripts that don't return the output path leave a single output in output_dir
+    if output_path is None:
+        outputs = glob.glob(os.path.join(output_dir, 'Quick_Assist_Ledger_Output_*.csv'))
+        if len(outputs) != 1:
+            raise RuntimeError(f"{module.__name__} failed to process {export_path}")
+        output_path = outputs[0]
+
+    ledger = pd.read_csv(output_path, dtype=str, keep_default_na=False)
+
+    report_path = os.path.splitext(output_path)[0] + '_report.json'
+    if os.path.exists(report_path):
+        with open(report_path) as report_file:
+            report = json.load(report_file)
+        stages = list(report['timings'])
+        report = {key: value for key, value in report.items() if key not in REPORT_RUN_FIELDS}
+    else:
+        report = parse_console_report(console.getvalue())
+        stages = None
+
+    return ledger, report, stages
+
+def parse_console_report(console):
+    """
+    Reads the subscription classification a script without a run report (e.g. the reference)
+    prints, into the run report fields of the current script.
+
+    Args:
+        console (str): The script's console output
+
+    Returns:
+        dict: 'counts' and the account lists that were printed (empty if none were)
+    """
+    headings = {heading: field for field, heading in CONSOLE_REPORT_LISTS.items()}
+    counts = {}
+    lists = {}
+    field = None
+    for line in console.splitlines():
+        count = next((key for key, label in CONSOLE_REPORT_COUNTS.items() if line.startswith(label)), None)
+        if count:
+            counts[count] = int(line.rsplit(':', 1)[1])
+        elif line in headings:
+            field = headings[line]
+            lists[field] = []
+        elif line.startswith('='):
+            field = None
+        elif field and line.startswith('- '):
+            lists[field].append(line[2:])
+
+    report = {'counts': counts} if counts else {}
+    report.update({field: lists[field] for field in ['active_subscribers', 'ended_subscriptions'] if field in lists})
+    if 'other_status' in lists:
+        report['other_status'] = [parse_other_status(entry) for entry in lists['other_status']]
+    if 'multiple_subscriptions' in lists:
+        report['multiple_subscriptions'] = dict(parse_subscriptions(entry) for entry in lists['multiple_subscriptions'])
+
+    return report
+
+def parse_other_status(entry):
+    """
+    Parses a printed other-status line, "Account (Note: ..., Opportunity_Type: ..., Account_Status: ...)",
+    into a run report entry (missing values print as nan).
+    """
+    match = re.fullmatch(r'(.*) \(Note: (.*), Opportunity_Type: (.*), Account_Status: (.*)\)', entry)
+    if not match:
+        return {'account': entry}
+
+    account, note, opportunity_type, account_status = match.groups()
+    return {'account': account, 'note': note,
+            'opportunity_type': None if opportunity_type == 'nan' else opportunity_type,
+            'account_status': None if account_status == 'nan' else account_status}
+
+def parse_subscriptions(entry):
+    """
+    Parses a printed multiple-subscription line, "Account (Account, Account_2)", into the account and
+    its subscriptions. Account names can contain " (" and ", " themselves, so the account ends at the
+    first " (" followed by the account name, and subscriptions are split before each repetition of it.
+    """
+    for match in re.finditer(r' \(', entry):
+        account, subscriptions = entry[:match.start()], entry[match.end():-1]
+        if entry.endswith(')') and subscriptions.startswith(account):
+            return account, re.split(', (?=' + re.escape(account) + ')', subscriptions)
+    return entry, []
+
+def compare_ledgers(reference, candidate):
+    """
+    Compares two ledgers row by row and groups the differences by account.
+
+    Args:
+        reference (pd.DataFrame): Reference ledger (values as text)
+        candidate (pd.DataFrame): Candidate ledger (values as text)
+
+    Returns:
+        dict: Account name -> description of how its rows differ (empty when the ledgers are identical)
+    """
+    if reference.equals(candidate):
+        return {}
+
+    if list(reference.columns) != list(candidate.columns):
+        return {'(columns)': f"reference {list(reference.columns)} vs candidate {list(candidate.columns)}"}
+
+    differences = {}
+    reference_rows = rows_by_account(reference)
+    candidate_rows = rows_by_account(candidate)
+    for account in sorted(set(reference_rows) | set(candidate_rows)):
+        expected = reference_rows.get(account, [])
+        actual = candidate_rows.get(account, [])
+        if expected == actual:
+            continue
+
+        # First row that differs, in the account's own row order
+        position = next((i for i, (e, a) in enumerate(zip(expected, actual)) if e != a), min(len(expected), len(actual)))
+        differences[account] = {
+            'reference_rows': len(expected),
+            'candidate_rows': len(actual),
+            'missing_rows': len(multiset_difference(expected, actual)),
+            'extra_rows': len(multiset_difference(actual, expected)),
+            'first_difference': position,
+            'reference_row': dict(zip(reference.columns, expected[position])) if position < len(expected) else None,
+            'candidate_row': dict(zip(candidate.columns, actual[position])) if position < len(actual) else None,
+        }
+
+    # Same rows per account, but the accounts are interleaved differently
+    if not differences:
+        differences['(row order)'] = "every account has the same rows, but the ledger lists them in a different order"
+
+    return differences
+
+def rows_by_account(ledger):
+    """
+    Returns the rows of a ledger (as tuples, in ledger order) grouped by Account_Name.
+    """
+    grouped = {}
+    for row in ledger.itertuples(index=False, name=None):
+        grouped.setdefault(row[0], []).append(row)
+    return grouped
+
+def multiset_difference(rows, other_rows):
+    """
+    Returns the rows that are in rows but not in other_rows, counting repeated rows.
+    """
+    remaining = {}
+    for row in other_rows:
+        remaining[row] = remaining.get(row, 0) + 1
+
+    difference = []
+    for row in rows:
+        if remaining.get(row, 0):
+            remaining[row] -= 1
+        else:
+            difference.append(row)
+    return difference
+
+def compare_engines(export_path, candidate_script=CANDIDATE_SCRIPT, candidate_options=None, now=None, work_dir=None,
+                    reference_script=REFERENCE_SCRIPT, reference_options=None):
+    """
+    Runs the reference script and a candidate engine on the same export and compares the results.
+
+    Args:
+        export_path (str): Closed Won export to process
+        candidate_script (str): Ledger script of the candidate (defaults to Quick_Assist_Ledger_V4.py)
+        candidate_options (dict, optional): process_file options of the candidate (e.g. shards, stream)
+        now (datetime, optional): Pinned now for both runs (defaults to the current time)
+        work_dir (str, optional): Directory for the outputs (defaults to a temporary directory)
+        reference_script (str): Ledger script of the reference (defaults to the frozen baseline)
+        reference_options (dict, optional): process_file options of the reference, if it takes any
+
+    Returns:
+        dict: 'ledger' (differences per account, see compare_ledgers), 'report' (run report fields
+              that differ) and, when the candidate runs with stream, 'streamed' (whether it streamed
+              the export rather than falling back to a full load)
+    """
+    now = now or datetime.now()
+    cleanup = work_dir is None
+    if cleanup:
+        work_dir = tempfile.mkdtemp(prefix='quick_assist_compare_')
+
+    try:
+        reference_module = load_ledger_module(reference_script, 'quick_assist_reference')
+        candidate_module = load_ledger_module(candidate_script, 'quick_assist_candidate')
+
+        reference, reference_report, _ = run_ledger(reference_module, export_path,
+                                                    os.path.join(work_dir, 'reference'), now,
+                                                    **(reference_options or {}))
+        candidate, candidate_report, candidate_stages = run_ledger(candidate_module, export_path,
+                                                                   os.path.join(work_dir, 'candidate'), now,
+                                                                   **(candidate_options or {}))
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # Reports are compared on the fields both have (the reference only prints the classification)
+    report_differences = report_differences_of(reference_report, candidate_report)
+
+    comparison = {'ledger': compare_ledgers(reference, candidate), 'report': report_differences}
+    # A streamed run scans the export instead of loading it; an unsorted export falls back to the load
+    if (candidate_options or {}).get('stream'):
+        comparison['streamed'] = candidate_stages is not None and 'scan' in candidate_stages \
+            and 'load' not in candidate_stages
+
+    return comparison
+
+def report_differences_of(reference_report, candidate_report):
+    """
+    Returns the run report fields (and, for 'counts', the counts) that differ between two reports,
+    looking only at the fields both reports have.
+    """
+    differences = []
+    for key in sorted(set(reference_report) & set(candidate_report)):
+        expected = reference_report[key]
+        actual = candidate_report[key]
+        if key == 'counts':
+            differences += [f"counts.{count}" for count in sorted(set(expected) & set(actual))
+                            if expected[count] != actual[count]]
+        elif expected != actual:
+            differences.append(key)
+    return differences
+
+def print_comparison(export_name, comparison, max_accounts=20):
+    """
+    Prints the result of compare_engines for one export.
+
+    Returns:
+        bool: True when the candidate matched the reference
+    """
+    if comparison.get('streamed') is False:
+        print(f"{export_name}: the candidate fell back to a full load instead of streaming "
+              f"(is the export sorted by Account Name?)")
+        return False
+
+    differences = comparison['ledger']
+    if not differences and not comparison['report']:
+        print(f"{export_name}: identical")
+        return True
+
+    print(f"{export_name}: {len(differences)} accounts differ")
+    for account in list(differences)[:max_accounts]:
+        difference = differences[account]
+        if isinstance(difference, str):
+            print(f"- {account}: {difference}")
+            continue
+        print(f"- {account}: {difference['reference_rows']} reference rows, {difference['candidate_rows']} candidate rows "
+              f"({difference['missing_rows']} missing, {difference['extra_rows']} extra), "
+              f"first difference at row {difference['first_difference'] + 1}")
+        print(f"    reference: {difference['reference_row']}")
+        print(f"    candidate: {difference['candidate_row']}")
+    if len(differences) > max_accounts:
+        print(f"- ... and {len(differences) - max_accounts} more accounts")
+    if comparison['report']:
+        print(f"Run report differs in: {', '.join(comparison['report'])}")
+
+    return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a candidate ledger engine with the reference V4 script.")
+    parser.add_argument('exports', nargs='*', help="Closed Won exports to compare on (default: synthetic exports)")
+    parser.add_argument('--reference', default=REFERENCE_SCRIPT,
+                        help="Ledger script of the reference (default: Quick_Assist_Ledger_V4_reference.py, "
+                             "the frozen pre-optimization V4)")
+    parser.add_argument('--candidate', default=CANDIDATE_SCRIPT,
+                        help="Ledger script of the candidate engine (default: Quick_Assist_Ledger_V4.py)")
+    parser.add_argument('--shards', type=int, default=1, help="Run the candidate with this many account shards")
+    parser.add_argument('--stream', action='store_true', help="Run the candidate with --stream")
+    parser.add_argument('--incremental', action='store_true', help="Run the candidate with --incremental")
+    parser.add_argument('--now', default='2025-10-18',
+                        help="Pinned current date for both runs, YYYY-MM-DD (default: 2025-10-18)")
+    parser.add_argument('--rows', type=int, default=2000, help="Rows per synthetic export (default: 2000)")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2],
+                        help="Seeds of the synthetic exports (default: 0 1 2)")
+    args = parser.parse_args()
+
+    candidate_options = {'shards': args.shards, 'stream': args.stream, 'incremental': args.incremental}
+    # Pinned at noon: the current script bills through the whole as-of day, while the reference bills
+    # up to the moment of now, so the two only agree once the day has started
+    now = datetime.strptime(args.now, '%Y-%m-%d').replace(hour=12)
+
+    with tempfile.TemporaryDirectory(prefix='quick_assist_compare_') as temp_dir:
+        # --stream only streams exports sorted by Account Name, so its synthetic exports are sorted
+        exports = args.exports or [write_closed_won_export(generate_closed_won(args.rows, seed=seed,
+                                                                               sort_by_account=args.stream),
+                                                           os.path.join(temp_dir, f'closed_won_{args.rows}_{seed}.csv'))
+                                   for seed in args.seeds]
+
+        all_identical = True
+        for export_path in exports:
+            comparison = compare_engines(export_path, args.candidate, candidate_options, now,
+                                         reference_script=args.reference)
+            all_identical = print_comparison(os.path.basename(export_path), comparison) and all_identical
+
+    sys.exit(0 if all_identical else 1)
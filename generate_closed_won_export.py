@@ -0,0 +1,181 @@
+import pandas as pd
+import numpy as np
+import os
+import argparse
+
+from Quick_Assist_Ledger_V4 import CLOSED_WON_COLUMNS
+
+# Accounts with special handling in Quick_Assist_Ledger_V4.py, so the generated exports exercise it
+SPECIAL_ACCOUNTS = [
+    'Copart, Inc', 'United Mortgage Lending', 'ADT Solar LLC (fka SUNPRO)',
+    'Electronic Caregiver', 'Sun Source Energy'
+]
+
+# Monthly subscription prices and On Demand amounts to pick from
+SUBSCRIPTION_PRICES = [99.0, 150.0, 250.0, 414.75, 500.0, 875.0, 1200.0, 2500.0]
+ON_DEMAND_AMOUNTS = [12.58, 25.0, 50.0, 100.0, 250.0]
+
+def generate_closed_won(n_rows, seed=0, subscriptions_per_account=3, reduction_rate=0.25, debook_rate=0.1,
+                        on_demand_rate=0.5, swap_rate=0.05, duplicate_rate=0.02, start_date='2019-01-01',
+                        end_date='2025-12-31', special_accounts=True, sort_by_account=False):
+    """
+    Generates a synthetic Closed Won export. The same arguments always give the same export.
+
+    Every account gets between 1 and subscriptions_per_account Service Optimization subscriptions
+    (350-0100 Add Products), some of which are later reduced (partially or fully) or debooked, plus
+    On Demand (350-0101) entries. Some subscriptions are swapped to On Demand: a zero-amount Add Products
+    entry with an On Demand entry under the same Opportunity ID. Exact duplicate rows are added on top.
+
+    Args:
+        n_rows (int): Number of rows of the export
+        seed (int): Random seed
+        subscriptions_per_account (int): Maximum number of subscriptions per account
+        reduction_rate (float): Share of subscriptions that get a Reduction
+        debook_rate (float): Share of subscriptions that get a Debook
+        on_demand_rate (float): Average number of On Demand entries per account
+        swap_rate (float): Share of accounts with a subscription swapped to On Demand
+        duplicate_rate (float): Share of rows that appear twice
+        start_date (str): First Close Date
+        end_date (str): Last Close Date
+        special_accounts (bool): Whether the first accounts are the specially handled accounts
+        sort_by_account (bool): Whether to sort the rows by Account Name (as --stream expects), keeping
+            them in random order within each account
+
+    Returns:
+        pd.DataFrame: The export, with the Close Date formatted as MM/DD/YYYY and rows in random order
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64(pd.Timestamp(start_date).date())
+    span_days = max((pd.Timestamp(end_date) - pd.Timestamp(start_date)).days, 1)
+
+    # Enough accounts for n_rows; the export is cut to size at the end
+    rows_per_account = ((1 + subscriptions_per_account) / 2 * (1 + reduction_rate + debook_rate) +
+                        on_demand_rate + 2 * swap_rate) * (1 + duplicate_rate)
+    n_accounts = int(np.ceil(n_rows / rows_per_account * 1.2)) + 1
+
+    accounts = pd.DataFrame({
+        'Account Name': [f'Synthetic Account {i:07d}' for i in range(n_accounts)],
+        'Five9 Account Number': rng.permutation(n_accounts) + 100000,
+        'Account ID': [f'ACC-{i:07d}' for i in range(n_accounts)],
+        'Account Status': rng.choice(np.array(['Active', 'Churned', None], dtype=object), n_accounts,
+                                     p=[0.8, 0.1, 0.1]),
+    })
+    if special_accounts:
+        names = SPECIAL_ACCOUNTS[:n_accounts]
+        accounts.loc[:len(names) - 1, 'Account Name'] = names
+
+    # Subscriptions: Add Products with a positive monthly price
+    subscription_account = np.repeat(np.arange(n_accounts), rng.integers(1, subscriptions_per_account + 1, n_accounts))
+    n_subscriptions = len(subscription_account)
+    subscription_day = rng.integers(0, span_days, n_subscriptions)
+    subscription_price = rng.choice(SUBSCRIPTION_PRICES, n_subscriptions)
+    events = [event_frame(subscription_account, subscription_day, '350-0100', subscription_price, 'Add Products')]
+
+    # Reductions (half of them partial) and Debooks some time after the subscription started
+    reduced = rng.random(n_subscriptions) < reduction_rate
+    reduction_share = rng.choice([0.5, 1.0], n_subscriptions)
+    events.append(event_frame(subscription_account[reduced],
+                              subscription_day[reduced] + rng.integers(30, 730, reduced.sum()), '350-0100',
+                              -(subscription_price * reduction_share)[reduced], 'Reduction'))
+    debooked = rng.random(n_subscriptions) < debook_rate
+    events.append(event_frame(subscription_account[debooked],
+                              subscription_day[debooked] + rng.integers(30, 730, debooked.sum()), '350-0100',
+                              -subscription_price[debooked], 'Debook'))
+
+    # On Demand entries
+    on_demand_account = np.repeat(np.arange(n_accounts), rng.poisson(on_demand_rate, n_accounts))
+    events.append(event_frame(on_demand_account, rng.integers(0, span_days, len(on_demand_account)), '350-0101',
+                              rng.choice(ON_DEMAND_AMOUNTS, len(on_demand_account)), 'Add Products'))
+
+    # Swaps to On Demand: a zero-amount subscription entry and an On Demand entry sharing the Opportunity ID
+    swap_account = np.flatnonzero(rng.random(n_accounts) < swap_rate)
+    swap_day = rng.integers(0, span_days, len(swap_account))
+    swap = event_frame(swap_account, swap_day, '350-0100', np.zeros(len(swap_account)), 'Add Products')
+    swap_on_demand = event_frame(swap_account, swap_day, '350-0101',
+                                 rng.choice(ON_DEMAND_AMOUNTS, len(swap_account)), 'Add Products')
+
+    events = pd.concat(events, ignore_index=True)
+    events['Opportunity ID'] = [f'OPP-{i:08d}' for i in range(len(events))]
+    swap_ids = [f'OPP-S{i:07d}' for i in range(len(swap_account))]
+    swap['Opportunity ID'] = swap_ids
+    swap_on_demand['Opportunity ID'] = swap_ids
+    events = pd.concat([events, swap, swap_on_demand], ignore_index=True)
+
+    # Keep the Close Dates within the span
+    events['Close Date'] = start + np.minimum(events.pop('Day').to_numpy(), span_days).astype('timedelta64[D]')
+
+    # Exact duplicates
+    duplicated = rng.random(len(events)) < duplicate_rate
+    events = pd.concat([events, events[duplicated]], ignore_index=True)
+
+    # Cut to size by account, so only the last account can be incomplete
+    events = events.sort_values('Account', kind='stable').head(n_rows)
+    export = events.join(accounts, on='Account').drop(columns='Account')
+    export['Close Date'] = export['Close Date'].dt.strftime('%m/%d/%Y')
+    export['Amount'] = export['Amount'].round(2)
+
+    # Rows come out of Salesforce in no particular order, unless the report is sorted by account
+    export = export.iloc[rng.permutation(len(export))]
+    if sort_by_account:
+        export = export.sort_values('Account Name', kind='stable')
+
+    return export[CLOSED_WON_COLUMNS].reset_index(drop=True)
+
+def event_frame(account, day, product_code, amount, opportunity_type):
+    """
+    Returns generated opportunities of one kind as a dataframe (account position and day offset).
+    """
+    return pd.DataFrame({
+        'Account': account,
+        'Day': day,
+        'Product Code': product_code,
+        'Amount': amount,
+        'Opportunity Type': opportunity_type,
+    })
+
+def write_closed_won_export(df, file_path):
+    """
+    Writes a generated export as CSV, the way Salesforce exports it.
+
+    Args:
+        df (pd.DataFrame): The export from generate_closed_won
+        file_path (str): Path of the CSV file
+
+    Returns:
+        str: Path of the CSV file
+    """
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    df.to_csv(file_path, index=False)
+    return file_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic Closed Won export.")
+    parser.add_argument('output', help="Path of the CSV file to write")
+    parser.add_argument('--rows', type=int, default=10000, help="Number of rows (default: 10000)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--subscriptions', type=int, default=3,
+                        help="Maximum number of subscriptions per account (default: 3)")
+    parser.add_argument('--reduction-rate', type=float, default=0.25, help="Share of subscriptions reduced")
+    parser.add_argument('--debook-rate', type=float, default=0.1, help="Share of subscriptions debooked")
+    parser.add_argument('--on-demand-rate', type=float, default=0.5,
+                        help="Average number of On Demand entries per account")
+    parser.add_argument('--swap-rate', type=float, default=0.05, help="Share of accounts swapped to On Demand")
+    parser.add_argument('--duplicate-rate', type=float, default=0.02, help="Share of rows duplicated")
+    parser.add_argument('--start-date', default='2019-01-01', help="First Close Date (YYYY-MM-DD)")
+    parser.add_argument('--end-date', default='2025-12-31', help="Last Close Date (YYYY-MM-DD)")
+    parser.add_argument('--no-special-accounts', action='store_true',
+                        help="Don't include the accounts with special handling")
+    parser.add_argument('--sorted', action='store_true',
+                        help="Sort the rows by Account Name, as exports streamed with --stream are")
+    args = parser.parse_args()
+
+    export = generate_closed_won(args.rows, seed=args.seed, subscriptions_per_account=args.subscriptions,
+                                 reduction_rate=args.reduction_rate, debook_rate=args.debook_rate,
+                                 on_demand_rate=args.on_demand_rate, swap_rate=args.swap_rate,
+                                 duplicate_rate=args.duplicate_rate, start_date=args.start_date,
+                                 end_date=args.end_date, special_accounts=not args.no_special_accounts,
+                                 sort_by_account=args.sorted)
+    print(f"Synthetic export with {len(export)} rows saved to {write_closed_won_export(export, args.output)}")
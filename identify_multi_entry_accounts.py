@@ -3,6 +3,8 @@ import glob
 import os
 from datetime import datetime
 
+from Quick_Assist_Ledger_V4 import CLOSED_WON_DTYPES, CLOSE_DATE_FORMAT, csv_engine
+
 def identify_multi_entry_accounts():
     """
     Identifies accounts that have:
@@ -28,9 +30,11 @@ def identify_multi_entry_accounts():
     most_recent_file = max(csv_files)
     print(f"Using file: {most_recent_file}")
     
-    # Load the CSV file
+    # Load the CSV file with the declared types for the columns present
     try:
-        df = pd.read_csv(most_recent_file)
+        columns = pd.read_csv(most_recent_file, nrows=0).columns
+        dtypes = {col: dtype for col, dtype in CLOSED_WON_DTYPES.items() if col in columns}
+        df = pd.read_csv(most_recent_file, dtype=dtypes, engine=csv_engine())
     except Exception as e:
         print(f"Error loading file: {e}")
         return
@@ -46,7 +50,7 @@ def identify_multi_entry_accounts():
         return
     
     # Convert 'Close Date' to datetime format
-    df['Close Date'] = pd.to_datetime(df['Close Date'], errors='coerce')
+    df['Close Date'] = pd.to_datetime(df['Close Date'], format=CLOSE_DATE_FORMAT, errors='coerce')
     
     # Filter for Service Optimization entries (Product Code 350-0100)
     so_df = df[df['Product Code'] == '350-0100'].copy()
@@ -1,10 +1,56 @@
 import pandas as pd
+import numpy as np
 import glob
 import os
+import sqlite3
 from datetime import datetime
 import calendar
 from dateutil.relativedelta import relativedelta
 
+from Quick_Assist_Ledger_V4 import CLOSED_WON_DTYPES, LEDGER_CATEGORICAL_COLUMNS, cents_to_amount, csv_engine
+
+# Low-cardinality ledger columns read as categoricals (output and raw column names)
+CATEGORICAL_COLUMNS = LEDGER_CATEGORICAL_COLUMNS + [col for col, dtype in CLOSED_WON_DTYPES.items() if dtype == 'category']
+
+# Date format of the Quick Assist Ledger output
+LEDGER_DATE_FORMAT = '%m/%d/%Y'
+
+# Ledger store written by Quick_Assist_Ledger_V4.py --store (queried instead of the output files when present)
+LEDGER_STORE_PATH = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Revenue Dashboard\QuickAssist_Ledger\Out\Quick_Assist_Ledger.sqlite"
+
+# Ledger store columns this script uses (amounts are stored as integer cents)
+LEDGER_STORE_COLUMNS = ['Account_Name', 'Date', 'Product_Code', 'Amount_Cents', 'Opportunity_Type', 'Account_Status', 'Note']
+
+def read_ledger_store(store_path, product_code):
+    """
+    Reads the ledger rows of one product code from the ledger store.
+    
+    Args:
+        store_path (str): Path of the SQLite ledger store
+        product_code (str): Product code to read (e.g. 350-0100)
+        
+    Returns:
+        pd.DataFrame: Ledger rows with the output column names, Date as datetime and Amount as in
+                      the CSV ledger: integers when every stored amount is a whole number of
+                      currency units, otherwise floats
+    """
+    connection = sqlite3.connect(store_path)
+    try:
+        df = pd.read_sql_query(f"SELECT {', '.join(LEDGER_STORE_COLUMNS)} FROM ledger WHERE Product_Code = ?",
+                               connection, params=[product_code])
+        # The CSV ledger writes whole amounts as integers only if all of its amounts are whole
+        has_fractions = connection.execute("SELECT EXISTS (SELECT 1 FROM ledger "
+                                           "WHERE Amount_Cents IS NULL OR Amount_Cents % 100 != 0)").fetchone()[0]
+    finally:
+        connection.close()
+    
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d', errors='coerce')
+    df['Amount'] = cents_to_amount(df.pop('Amount_Cents'), np.dtype('float64' if has_fractions else 'int64'))
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
 def identify_multiple_subscription_accounts():
     """
     Identifies accounts that have:
@@ -17,28 +63,39 @@ def identify_multiple_subscription_accounts():
     # Define directory path for input files
     input_dir = r"C:\Users\mcgace1\OneDrive - Five9\Documents\Five9\Projects\aii\SO Dashboards\Test Files"
     
-    # Look for Quick Assist Ledger output files first (preferred)
-    ledger_files = glob.glob(os.path.join(input_dir, "Quick_Assist_Ledger_Output*.csv"))
-    
-    if not ledger_files:
-        print("No Quick Assist Ledger output files found. Looking for raw opportunity files...")
-        # Fall back to Opportunities files
-        ledger_files = glob.glob(os.path.join(input_dir, "*Opportunities*.csv"))
+    # Query the ledger store when there is one, so only the Service Optimization rows are read
+    if os.path.exists(LEDGER_STORE_PATH):
+        print(f"Using ledger store: {LEDGER_STORE_PATH}")
+        try:
+            df = read_ledger_store(LEDGER_STORE_PATH, '350-0100')
+        except Exception as e:
+            print(f"Error reading ledger store: {e}")
+            return
+    else:
+        # Look for Quick Assist Ledger output files first (preferred)
+        ledger_files = glob.glob(os.path.join(input_dir, "Quick_Assist_Ledger_Output*.csv"))
+        
         if not ledger_files:
-            print("No suitable CSV files found. Please run Quick_Assist_Ledger_V2.py first or check file names.")
+            print("No Quick Assist Ledger output files found. Looking for raw opportunity files...")
+            # Fall back to Opportunities files
+            ledger_files = glob.glob(os.path.join(input_dir, "*Opportunities*.csv"))
+            if not ledger_files:
+                print("No suitable CSV files found. Please run Quick_Assist_Ledger_V2.py first or check file names.")
+                return
+        
+        # Use the most recent file based on filename
+        most_recent_file = max(ledger_files)
+        print(f"Using file: {most_recent_file}")
+        
+        # Load the CSV file with the low-cardinality columns as categoricals
+        try:
+            columns = pd.read_csv(most_recent_file, nrows=0).columns
+            dtypes = {col: 'category' for col in CATEGORICAL_COLUMNS if col in columns}
+            df = pd.read_csv(most_recent_file, dtype=dtypes, engine=csv_engine())
+        except Exception as e:
+            print(f"Error loading file: {e}")
             return
     
-    # Use the most recent file based on filename
-    most_recent_file = max(ledger_files)
-    print(f"Using file: {most_recent_file}")
-    
-    # Load the CSV file
-    try:
-        df = pd.read_csv(most_recent_file)
-    except Exception as e:
-        print(f"Error loading file: {e}")
-        return
-    
     # Check for required columns - adjusted for both original and processed files
     if 'Note' in df.columns:
         # This is a processed file from Quick_Assist_Ledger output
@@ -54,8 +111,9 @@ def identify_multiple_subscription_accounts():
         print("This file doesn't have a 'Note' column. Please run Quick_Assist_Ledger_V2.py first.")
         return
     
-    # Convert date to datetime format
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+    # Convert date to datetime format (dates read from the ledger store already are)
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df[date_col] = pd.to_datetime(df[date_col], format=LEDGER_DATE_FORMAT, errors='coerce')
     
     # Filter for Service Optimization entries (Product Code 350-0100)
     so_df = df[df[product_col] == '350-0100'].copy()
@@ -0,0 +1,83 @@
+import os
+import io
+import argparse
+import contextlib
+
+import Quick_Assist_Ledger_V4 as ledger
+
+def plan_export(export_path):
+    """
+    Runs the grouped engine on a Closed Won export up to its ledger plan: the emitted rows plus one
+    billing interval per subscription, before any monthly Subscribed Billing row is expanded.
+
+    Returns:
+        tuple: (ledger plan from plan_ledger, dtype of the Amount column as read)
+    """
+    # The engine's own console notices (e.g. rounded amounts) are not part of the totals
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = ledger.read_closed_won(export_path)
+        amount_dtype = df['Amount'].dtype
+        plan = ledger.plan_ledger(ledger.prepare_closed_won(df))
+
+    return plan, amount_dtype
+
+def monthly_totals(plan, amount_dtype, as_of=None):
+    """
+    Totals the ledger amounts per month from the billing intervals of a plan.
+
+    Returns:
+        pd.DataFrame: 'Subscribed_Billing' and 'Amount' per month, in the export's amount format
+    """
+    totals = ledger.monthly_ledger_amounts(plan, ledger.resolve_as_of(as_of))
+    totals.columns = [col.replace(' ', '_') for col in totals.columns]
+    for col in totals.columns:
+        totals[col] = ledger.cents_to_amount(totals[col].reset_index(drop=True), amount_dtype).to_numpy()
+
+    return totals
+
+def write_planned_ledger(plan, amount_dtype, output_path, as_of=None, chunk_rows=ledger.STREAM_CHUNK_ROWS):
+    """
+    Writes the ledger rows of a plan as CSV one chunk at a time (see iter_ledger_plan), so the
+    monthly rows are only expanded while they are written.
+
+    Returns:
+        int: Number of ledger rows written
+    """
+    # Every ledger amount is an emitted row's amount, so the emitted rows decide the format of all chunks
+    amount_dtype = ledger.cents_to_amount(plan['rows']['Amount'], amount_dtype).dtype
+
+    num_rows = 0
+    for chunk in ledger.iter_ledger_plan(plan, ledger.resolve_as_of(as_of), chunk_rows):
+        chunk.columns = [col.replace(' ', '_') for col in chunk.columns]
+        chunk['Note'] = ledger.render_notes(chunk['Note_Code'], chunk['Note_Suffix'])
+        chunk['Date'] = chunk['Date'].dt.strftime('%m/%d/%Y')
+        chunk['Amount'] = ledger.cents_to_amount(chunk['Amount'], amount_dtype)
+        chunk.to_csv(output_path, mode='w' if num_rows == 0 else 'a', header=num_rows == 0, index=False,
+                     columns=ledger.LEDGER_OUTPUT_COLUMNS)
+        num_rows += len(chunk)
+
+    return num_rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Total the Quick Assist ledger amounts per month from the "
+                                                 "subscription intervals of a Closed Won export.")
+    parser.add_argument('export', help="Closed Won export")
+    parser.add_argument('--as-of', default=None,
+                        help="Bill subscriptions up to and including this date, YYYY-MM-DD (default: today)")
+    parser.add_argument('--output', default=None, help="Also save the totals to this CSV file")
+    parser.add_argument('--ledger', default=None,
+                        help="Also write the ledger rows to this CSV file, expanding the monthly rows chunk by chunk")
+    args = parser.parse_args()
+
+    plan, amount_dtype = plan_export(args.export)
+    totals = monthly_totals(plan, amount_dtype, args.as_of)
+    print(f"Monthly ledger totals for {os.path.basename(args.export)} (before special intermediate entries):")
+    print(totals.to_string())
+
+    if args.output:
+        totals.to_csv(args.output)
+        print(f"Monthly totals saved to {args.output}")
+
+    if args.ledger:
+        num_rows = write_planned_ledger(plan, amount_dtype, args.ledger, args.as_of)
+        print(f"{num_rows} ledger rows saved to {args.ledger}")